@@ -2,11 +2,30 @@ __license__ = "MIT"
 __version__ = "1.2.0"
 __author__ = "Szymon Mikler"
 
+from .concurrent import ConcurrentSliceMap
+from .frozen import FrozenSliceMap
+from .instrumentation import Instrumentation
+from .persistent import PersistentSliceMap, SliceMapVersion
 from .slicemap import SliceMap
 
 try:
     from .plotting import plot_slicemap
 
-    __all__ = ["SliceMap", "plot_slicemap"]
+    __all__ = [
+        "SliceMap",
+        "FrozenSliceMap",
+        "ConcurrentSliceMap",
+        "Instrumentation",
+        "PersistentSliceMap",
+        "SliceMapVersion",
+        "plot_slicemap",
+    ]
 except ImportError:
-    __all__ = ["SliceMap"]
+    __all__ = [
+        "SliceMap",
+        "FrozenSliceMap",
+        "ConcurrentSliceMap",
+        "Instrumentation",
+        "PersistentSliceMap",
+        "SliceMapVersion",
+    ]
@@ -1,32 +1,439 @@
+"""Benchmark suite for SliceMap.
+
+Run with ``python -m slicemap.benchmarks``. See ``python -m slicemap.benchmarks --help``
+for all options. Results can be saved as JSON and compared against a baseline
+to catch performance regressions, e.g.::
+
+    python -m slicemap.benchmarks --sizes 1e3,1e5 --output baseline.json
+    python -m slicemap.benchmarks --sizes 1e3,1e5 --baseline baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
 import random
+import sys
+import tempfile
+import threading
 import time
+import tracemalloc
+from typing import Any, Callable
+
+from slicemap import ConcurrentSliceMap, SliceMap, __version__
+
+BENCHMARKS: dict[str, Callable[..., list[int]]] = {}
+
 
-from slicemap import SliceMap
+def benchmark(func: Callable[..., list[int]]) -> Callable[..., list[int]]:
+    """Register a benchmark. It takes ``n`` and SliceMap kwargs, returns durations of operations in ns."""
+    BENCHMARKS[func.__name__.rstrip("_")] = func
+    return func
 
 
-def benchmark_insert_random(n=100):
-    """Insert random values to SliceMap and time the execution."""
-    r = SliceMap()
-    randoms = []
+def _time_each(operation: Callable[[Any], Any], args: list) -> list[int]:
+    timer = time.perf_counter_ns
+    durations = []
+    for arg in args:
+        t0 = timer()
+        operation(arg)
+        durations.append(timer() - t0)
+    return durations
+
+
+def _random_slices(n: int) -> list[tuple[float, float, float]]:
+    slices = []
     for _ in range(n):
         a, b = sorted([random.random(), random.random()])
-        randoms.append([a, b, random.random()])
-
-    t0 = time.perf_counter()
-    for a, b, v in randoms:
-        r[a:b] = v
-    print(time.perf_counter() - t0)
-
-
-def benchmark_insert_range(n=100):
-    """Insert range of values to SliceMap and time the execution."""
-    r = SliceMap()
-    numbers = []
-    for i in range(n):
-        a, b = (i, i + 1)
-        numbers.append([a, b, random.random()])
-
-    t0 = time.perf_counter()
-    for a, b, v in numbers:
-        r[a:b] = v
-    print(time.perf_counter() - t0)
+        slices.append((a * n, b * n, random.random()))
+    return slices
+
+
+def _sequential_map(n: int, **kwargs: Any) -> SliceMap:
+    return SliceMap.from_slices(((i, i + 1, random.random()) for i in range(n)), **kwargs)
+
+
+def _set(sm: SliceMap) -> Callable[[tuple], None]:
+    def operation(args: tuple) -> None:
+        a, b, v = args
+        sm[a:b] = v
+
+    return operation
+
+
+@benchmark
+def insert_random(n: int, **kwargs: Any) -> list[int]:
+    """Insert random slices, overlapping each other."""
+    return _time_each(_set(SliceMap(**kwargs)), _random_slices(n))
+
+
+@benchmark
+def insert_sequential(n: int, **kwargs: Any) -> list[int]:
+    """Insert adjacent slices in increasing order."""
+    return _time_each(_set(SliceMap(**kwargs)), [(i, i + 1, random.random()) for i in range(n)])
+
+
+@benchmark
+def append(n: int, **kwargs: Any) -> list[int]:
+    """Append adjacent slices in increasing order with ``append``."""
+    sm = SliceMap(**kwargs)
+    return _time_each(lambda x: sm.append(*x), [(i, i + 1, random.random()) for i in range(n)])
+
+
+@benchmark
+def insert_nested(n: int, **kwargs: Any) -> list[int]:
+    """Insert slices, each nested inside the previous one."""
+    return _time_each(_set(SliceMap(**kwargs)), [(i, 2 * n - i, random.random()) for i in range(n)])
+
+
+@benchmark
+def from_slices(n: int, **kwargs: Any) -> list[int]:
+    """Build SliceMap from random slices in bulk."""
+    slices = _random_slices(n)
+    return _time_each(lambda x: SliceMap.from_slices(x, **kwargs), [slices])
+
+
+def _build_sequential(slices: list[tuple], **kwargs: Any) -> SliceMap:
+    sm = SliceMap(**kwargs)
+    for a, b, v in slices:
+        sm[a:b] = v
+    return sm
+
+
+@benchmark
+def build_sequential(n: int, **kwargs: Any) -> list[int]:
+    """Build SliceMap by setting random slices one by one, timed as a single operation."""
+    slices = _random_slices(n)
+    return _time_each(lambda x: _build_sequential(x, **kwargs), [slices])
+
+
+@benchmark
+def build_parallel(n: int, **kwargs: Any) -> list[int]:
+    """Build SliceMap from random slices in 4 chunks with ``build_parallel`` and 4 workers."""
+    slices = _random_slices(n)
+    chunks = [slices[idx : idx + n // 4 + 1] for idx in range(0, n, n // 4 + 1)]
+    return _time_each(lambda x: SliceMap.build_parallel(x, workers=4, **kwargs), [chunks])
+
+
+@benchmark
+def lookup_point(n: int, **kwargs: Any) -> list[int]:
+    """Query values under random keys."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(sm.__getitem__, [random.random() * n for _ in range(n)])
+
+
+@benchmark
+def lookup_sequential(n: int, **kwargs: Any) -> list[int]:
+    """Query values under increasing keys, four keys per slice."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(sm.__getitem__, [i / 4 for i in range(4 * n)])
+
+
+@benchmark
+def lookup_random_walk(n: int, **kwargs: Any) -> list[int]:
+    """Query values under keys changing in a random walk, with steps of about half a slice."""
+    sm = _sequential_map(n, **kwargs)
+    keys = [n / 2]
+    for _ in range(n - 1):
+        keys.append(keys[-1] + random.gauss(0, 0.5))
+    return _time_each(sm.__getitem__, keys)
+
+
+@benchmark
+def lookup_range(n: int, **kwargs: Any) -> list[int]:
+    """Query values in random ranges of keys, each covering 10 slices."""
+    sm = _sequential_map(n, **kwargs)
+    starts = [random.random() * n for _ in range(n)]
+    return _time_each(sm.__getitem__, [slice(x, x + 10) for x in starts])
+
+
+@benchmark
+def join_ranges(n: int, **kwargs: Any) -> list[int]:
+    """Find slices in sorted, random ranges of keys, each covering 10 slices, with one ``join_ranges`` call."""
+    sm = _sequential_map(n, **kwargs)
+    starts = sorted(random.random() * n for _ in range(n))
+    stops = [x + 10 for x in starts]
+    return _time_each(lambda x: sm.join_ranges(*x, assume_sorted=True), [(starts, stops)])
+
+
+@benchmark
+def aggregate_range(n: int, **kwargs: Any) -> list[int]:
+    """Query the maximum value in random ranges of keys, each covering 10 slices."""
+    sm = _sequential_map(n, **kwargs)
+    sm.aggregate(op="max")
+    starts = [random.random() * n for _ in range(n)]
+    return _time_each(lambda x: sm.aggregate(x, x + 10, "max"), starts)
+
+
+@benchmark
+def aggregate_after_insert(n: int, **kwargs: Any) -> list[int]:
+    """Set a random slice, then query the maximum value in a random range covering a tenth of keys."""
+    sm = _sequential_map(n, **kwargs)
+
+    def insert_and_aggregate(x: float) -> None:
+        sm[x : x + 1] = random.random()
+        sm.aggregate(x, x + n / 10, "max")
+
+    return _time_each(insert_and_aggregate, [random.random() * n for _ in range(min(n, 1000))])
+
+
+@benchmark
+def add_range(n: int, **kwargs: Any) -> list[int]:
+    """Add 1 to values of random ranges of keys, each covering a tenth of slices."""
+    sm = _sequential_map(n, **kwargs)
+    starts = [random.random() * n for _ in range(min(n, 1000))]
+    return _time_each(lambda x: sm.add(slice(x, x + n / 10), 1), starts)
+
+
+@benchmark
+def find(n: int, **kwargs: Any) -> list[int]:
+    """Find all slices of random values, out of 100 distinct values, with ``index_values=True``."""
+    kwargs["index_values"] = True
+    sm = SliceMap.from_slices(((i, i + 1, i % 100) for i in range(n)), **kwargs)
+    return _time_each(lambda x: list(sm.find(x)), [random.randrange(100) for _ in range(100)])
+
+
+@benchmark
+def lookup_frozen(n: int, **kwargs: Any) -> list[int]:
+    """Query values under random keys in FrozenSliceMap."""
+    frozen = _sequential_map(n, **kwargs).freeze()
+    return _time_each(frozen.__getitem__, [random.random() * n for _ in range(n)])
+
+
+@benchmark
+def lookup_many(n: int, **kwargs: Any) -> list[int]:
+    """Query values under random keys with a single ``get_many`` call."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(sm.get_many, [[random.random() * n for _ in range(n)]])
+
+
+@benchmark
+def open_mmap(n: int, **kwargs: Any) -> list[int]:
+    """Open a saved SliceMap with mmap and query one key."""
+    sm = _sequential_map(n, **kwargs)
+    fd, path = tempfile.mkstemp(suffix=".slicemap")
+    os.close(fd)
+    try:
+        sm.save(path)
+        return _time_each(lambda _: SliceMap.open(path)[n / 2], range(3))
+    finally:
+        os.remove(path)
+
+
+def _concurrent(n: int, readers: int, **kwargs: Any) -> list[int]:
+    """Run readers querying random keys while one writer inserts batches of 100 slices."""
+    sm = ConcurrentSliceMap(**kwargs)
+    sm.update((i, i + 1, random.random()) for i in range(n))
+    sm.publish()
+    reads = [[random.random() * n for _ in range(n)] for _ in range(readers)]
+    writes = _random_slices(max(n // 10, 100))
+    durations: list[list[int]] = []
+
+    def write_batches() -> None:
+        timer = time.perf_counter_ns
+        batch_durations = []
+        for idx in range(0, len(writes), 100):
+            t0 = timer()
+            with sm.batch():
+                for a, b, v in writes[idx : idx + 100]:
+                    sm[a:b] = v
+            batch_durations.append(timer() - t0)
+        durations.append(batch_durations)
+
+    threads = [threading.Thread(target=lambda x=x: durations.append(_time_each(sm.__getitem__, x))) for x in reads]
+    threads.append(threading.Thread(target=write_batches))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [x for thread_durations in durations for x in thread_durations]
+
+
+@benchmark
+def concurrent_1_reader(n: int, **kwargs: Any) -> list[int]:
+    """Query ConcurrentSliceMap from 1 thread, while another thread publishes batches of inserts."""
+    return _concurrent(n, readers=1, **kwargs)
+
+
+@benchmark
+def concurrent_4_readers(n: int, **kwargs: Any) -> list[int]:
+    """Query ConcurrentSliceMap from 4 threads, while another thread publishes batches of inserts."""
+    return _concurrent(n, readers=4, **kwargs)
+
+
+@benchmark
+def concurrent_16_readers(n: int, **kwargs: Any) -> list[int]:
+    """Query ConcurrentSliceMap from 16 threads, while another thread publishes batches of inserts."""
+    return _concurrent(n, readers=16, **kwargs)
+
+
+@benchmark
+def export(n: int, **kwargs: Any) -> list[int]:
+    """Export all slices."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(lambda _: sm.export(), range(3))
+
+
+@benchmark
+def copy(n: int, **kwargs: Any) -> list[int]:
+    """Copy SliceMap."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(lambda _: sm.copy(), range(3))
+
+
+@benchmark
+def snapshot(n: int, **kwargs: Any) -> list[int]:
+    """Take copy-on-write snapshots of SliceMap."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(lambda _: sm.snapshot(), range(100))
+
+
+@benchmark
+def repr_(n: int, **kwargs: Any) -> list[int]:
+    """Format SliceMap as string."""
+    sm = _sequential_map(n, **kwargs)
+    return _time_each(lambda _: repr(sm), range(3))
+
+
+@benchmark
+def plot(n: int, **kwargs: Any) -> list[int]:
+    """Plot and render SliceMap without showing the figure. Requires matplotlib."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from slicemap import plot_slicemap
+
+    sm = _sequential_map(n, **kwargs)
+
+    def operation(_: Any) -> None:
+        plot_slicemap(sm, show=False)
+        plt.gcf().canvas.draw()
+        plt.close("all")
+
+    return _time_each(operation, range(3))
+
+
+def _percentile(sorted_values: list[int], q: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_benchmark(name: str, n: int, memory: bool = True, seed: int = 0, **kwargs: Any) -> dict[str, Any]:
+    """Run a single benchmark and return its results.
+
+    Timing and peak memory are measured in separate runs, because ``tracemalloc``
+    slows down the execution considerably.
+    """
+    random.seed(seed)
+    durations = BENCHMARKS[name](n, **kwargs)
+    total = sum(durations)
+    durations.sort()
+    result = {
+        "benchmark": name,
+        "n": n,
+        "operations": len(durations),
+        "total_s": total / 1e9,
+        "throughput_ops": len(durations) / (total / 1e9) if total else float("inf"),
+        "p50_ns": _percentile(durations, 0.5),
+        "p90_ns": _percentile(durations, 0.9),
+        "p99_ns": _percentile(durations, 0.99),
+        "max_ns": durations[-1],
+    }
+    if memory:
+        random.seed(seed)
+        tracemalloc.start()
+        try:
+            BENCHMARKS[name](n, **kwargs)
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """Compare throughput with baseline. Return results slower than ``threshold`` times the baseline."""
+    baseline_throughput = {(x["benchmark"], x["n"]): x["throughput_ops"] for x in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_throughput.get((result["benchmark"], result["n"]))
+        if reference:
+            result["baseline_ratio"] = result["throughput_ops"] / reference
+            if result["baseline_ratio"] < threshold:
+                regressions.append(result)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m slicemap.benchmarks", description="Benchmark SliceMap.")
+    parser.add_argument("--sizes", default="1e2,1e3,1e4", help="comma-separated sizes, e.g. 1e2,1e5,1e7")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="comma-separated benchmark names")
+    parser.add_argument("--storage", default="sortedlist", choices=["sortedlist", "array", "tree"])
+    parser.add_argument("--lookup-cache", action="store_true", help="create SliceMaps with lookup_cache=True")
+    parser.add_argument("--index-values", action="store_true", help="create SliceMaps with index_values=True")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save results as JSON to this path")
+    parser.add_argument("--baseline", help="compare results with JSON saved previously with --output")
+    parser.add_argument("--threshold", type=float, default=0.9, help="fail if throughput < threshold * baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(x)) for x in args.sizes.split(",")]
+    names = args.benchmarks.split(",")
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}, choose from: {', '.join(BENCHMARKS)}")
+
+    results = []
+    print(f"{'benchmark':<20}{'n':>10}{'ops/s':>14}{'p50 [us]':>12}{'p99 [us]':>12}{'peak [MB]':>12}")
+    for name in names:
+        for n in sizes:
+            try:
+                result = run_benchmark(
+                    name,
+                    n,
+                    memory=not args.no_memory,
+                    seed=args.seed,
+                    storage=args.storage,
+                    lookup_cache=args.lookup_cache,
+                    index_values=args.index_values,
+                )
+            except ImportError as e:
+                print(f"{name:<20}{n:>10}  skipped: {e}")
+                continue
+            results.append(result)
+            peak = result.get("peak_memory_bytes", float("nan")) / 2**20
+            print(
+                f"{name:<20}{n:>10}{result['throughput_ops']:>14.0f}"
+                f"{result['p50_ns'] / 1e3:>12.2f}{result['p99_ns'] / 1e3:>12.2f}{peak:>12.2f}"
+            )
+
+    report = {
+        "slicemap": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": args.storage,
+        "lookup_cache": args.lookup_cache,
+        "index_values": args.index_values,
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for result in regressions:
+            print(f"Regression: {result['benchmark']} n={result['n']} at {result['baseline_ratio']:.2f}x baseline")
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, SupportsFloat
+
+from .frozen import FrozenSliceMap
+from .slicemap import Slice, SliceMap, _format_slices
+
+
+class ConcurrentSliceMap:
+    """SliceMap that can be shared between a writer and many reader threads.
+
+    Readers query the latest published FrozenSliceMap, an immutable snapshot, so
+    they never take a lock and never see a partially applied update. Writers
+    modify a private SliceMap under a lock. Their changes become visible to
+    readers only after ``publish``, which atomically replaces the snapshot.
+
+    Publishing takes ``O(n)`` time, so writers should batch their updates,
+    e.g. with ``batch`` context manager.
+    """
+
+    def __init__(self, include: str = "start", raise_missing: bool = False, **kwargs: Any):
+        """
+        Parameters
+        ----------
+        include
+            See ``SliceMap.__init__``.
+        raise_missing
+            See ``SliceMap.__init__``.
+        kwargs
+            Other parameters, passed to the private SliceMap modified by writers.
+        """
+        self._lock = threading.RLock()
+        self._writer_map = SliceMap(include=include, raise_missing=raise_missing, **kwargs)
+        self._snapshot = self._writer_map.freeze()
+        self._dirty = False
+
+    def snapshot(self) -> FrozenSliceMap:
+        """Return the latest published snapshot. Use it for many consistent reads."""
+        return self._snapshot
+
+    def __setitem__(self, slice_key: slice, value: Any) -> None:
+        """Add a new slice. It becomes visible to readers after ``publish``."""
+        with self._lock:
+            self._writer_map[slice_key] = value
+            self._dirty = True
+
+    def update(self, slices: Iterable[tuple[SupportsFloat | None, SupportsFloat | None, Any]]) -> None:
+        """Add many slices at once. They become visible to readers after ``publish``."""
+        with self._lock:
+            self._writer_map.update(slices)
+            self._dirty = True
+
+    def publish(self) -> FrozenSliceMap:
+        """Make all changes visible to readers at once. Returns the published snapshot."""
+        with self._lock:
+            if self._dirty:
+                self._snapshot = self._writer_map.freeze()
+                self._dirty = False
+            return self._snapshot
+
+    @contextmanager
+    def batch(self) -> Iterator[ConcurrentSliceMap]:
+        """Hold the writer lock for many updates and publish them together on exit."""
+        with self._lock:
+            yield self
+            self.publish()
+
+    def __getitem__(self, key: SupportsFloat | slice) -> Any:
+        """Check the value under the given key in the latest snapshot. See ``SliceMap.__getitem__``."""
+        return self._snapshot[key]
+
+    def get_many(self, keys: Iterable[SupportsFloat], assume_sorted: bool = False) -> Any:
+        """Check the values under many keys in the latest snapshot. See ``SliceMap.get_many``."""
+        return self._snapshot.get_many(keys, assume_sorted)
+
+    def get_slice_at(self, key: SupportsFloat) -> Slice:
+        """Check the slice at the given key in the latest snapshot."""
+        return self._snapshot.get_slice_at(key)
+
+    def export(self) -> list[Slice]:
+        """Export the latest snapshot as list of tuples."""
+        return self._snapshot.export()
+
+    def __len__(self) -> int:
+        """Return the number of slices in the latest snapshot."""
+        return len(self._snapshot)
+
+    def __repr__(self) -> str:
+        snapshot = self._snapshot
+        return "ConcurrentSliceMap(" + _format_slices(snapshot._iter_slices(), snapshot.include) + ")"
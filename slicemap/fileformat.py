@@ -0,0 +1,262 @@
+"""Compact binary file format for SliceMap.
+
+Layout of the file, all offsets are aligned to 8 bytes:
+
+* header, see ``_HEADER``
+* finite slice boundaries, as float64 or int64 array
+* missing flags of slices, as a bitmap
+* codes of slice values, as uint32 array
+* value table, a pickled list of distinct values
+
+Arrays are stored in the native byte order of the machine that saved the file.
+Opened files can be memory-mapped, so loading takes constant time (apart from
+unpickling the value table) and the pages are shared between processes.
+The same format is used for SliceMaps published in shared memory.
+
+The value table is read with ``pickle``, so loading data from an untrusted source
+can execute arbitrary code.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from typing import Any, Sequence
+
+from .frozen import FrozenSliceMap
+
+MAGIC = b"SLICEMAP"
+VERSION = 1
+
+# magic, version, byte order, key typecode, include, raise_missing,
+# number of slices, offsets of boundaries, missing bitmap, codes and value table
+_HEADER = struct.Struct("<8sBBcBBxxxQQQQQ")
+_CODE_SIZE = array("I").itemsize
+
+# Names of shared memory blocks created by this process, see ``attach``
+_published_names: set[str] = set()
+
+
+class Bitmap:
+    """Read-only sequence of booleans packed in bits."""
+
+    __slots__ = ("buffer", "length")
+
+    def __init__(self, buffer: Any, length: int):
+        self.buffer = buffer
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, idx: int) -> bool:
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError("Bitmap index out of range")
+        return bool(self.buffer[idx >> 3] >> (idx & 7) & 1)
+
+    def __iter__(self):
+        buffer = self.buffer
+        return (bool(buffer[idx >> 3] >> (idx & 7) & 1) for idx in range(self.length))
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> Any:
+        import numpy as np
+
+        bits = np.unpackbits(np.frombuffer(self.buffer, dtype=np.uint8), bitorder="little")[: self.length]
+        return bits.astype(dtype if dtype is not None else bool)
+
+
+class ValueTable:
+    """Read-only sequence of values, decoded from codes and a table of distinct values."""
+
+    __slots__ = ("codes", "table")
+
+    def __init__(self, codes: Sequence[int], table: list[Any]):
+        self.codes = codes
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, idx: int) -> Any:
+        return self.table[self.codes[idx]]
+
+    def __iter__(self):
+        table = self.table
+        return (table[code] for code in self.codes)
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> Any:
+        import numpy as np
+
+        from .slicemap import _object_array
+
+        values = _object_array(self.table)[np.asarray(self.codes, dtype=np.intp)]
+        return values if dtype is None else values.astype(dtype)
+
+
+def _pack_bits(flags: Sequence[bool]) -> bytes:
+    packed = bytearray((len(flags) + 7) // 8)
+    for idx, flag in enumerate(flags):
+        if flag:
+            packed[idx >> 3] |= 1 << (idx & 7)
+    return bytes(packed)
+
+
+def _encode_values(values: Sequence[Any]) -> tuple[array, list[Any]]:
+    """Deduplicate values. Hashable values are compared by type and equality, others by identity."""
+    codes = array("I")
+    table: list[Any] = []
+    known: dict[Any, int] = {}
+    for value in values:
+        try:
+            dict_key = (type(value), value)
+            hash(dict_key)
+        except TypeError:
+            dict_key = ("id", id(value))
+        code = known.get(dict_key)
+        if code is None:
+            code = known[dict_key] = len(table)
+            table.append(value)
+        codes.append(code)
+    return codes, table
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def _encode(frozen: FrozenSliceMap) -> tuple[int, list[tuple[int, bytes]]]:
+    """Return the total size in bytes and chunks of the binary format with their offsets."""
+    keys = list(frozen.keys)
+    typecode = "q" if all(isinstance(key, int) and -(2**63) <= key < 2**63 for key in keys) else "d"
+    key_bytes = array(typecode, keys).tobytes()
+    missing_bytes = _pack_bits(list(frozen.missing))
+    codes, table = _encode_values(list(frozen.values))
+    table_bytes = pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL)
+
+    keys_offset = _align(_HEADER.size)
+    missing_offset = _align(keys_offset + len(key_bytes))
+    codes_offset = _align(missing_offset + len(missing_bytes))
+    table_offset = _align(codes_offset + len(codes) * _CODE_SIZE)
+
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        sys.byteorder == "little",
+        typecode.encode(),
+        frozen.include == "end",
+        frozen.raise_missing,
+        len(frozen.values),
+        keys_offset,
+        missing_offset,
+        codes_offset,
+        table_offset,
+    )
+    chunks = [
+        (0, header),
+        (keys_offset, key_bytes),
+        (missing_offset, missing_bytes),
+        (codes_offset, codes.tobytes()),
+        (table_offset, table_bytes),
+    ]
+    return table_offset + len(table_bytes), chunks
+
+
+def _decode(buffer: memoryview, source: str) -> FrozenSliceMap:
+    """Create FrozenSliceMap backed by the buffer, without copying the arrays."""
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f"{source} is not a SliceMap")
+    (
+        magic,
+        version,
+        little_endian,
+        typecode,
+        include_end,
+        raise_missing,
+        num_slices,
+        keys_offset,
+        missing_offset,
+        codes_offset,
+        table_offset,
+    ) = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{source} is not a SliceMap")
+    if version != VERSION:
+        raise ValueError(f"Unsupported SliceMap format version {version}")
+    if bool(little_endian) != (sys.byteorder == "little"):
+        raise ValueError(f"{source} was saved on a machine with different byte order")
+
+    typecode = typecode.decode()
+    keys = buffer[keys_offset : keys_offset + (num_slices - 1) * 8].cast(typecode)
+    missing = Bitmap(buffer[missing_offset:codes_offset], num_slices)
+    codes = buffer[codes_offset : codes_offset + num_slices * _CODE_SIZE].cast("I")
+    table = pickle.loads(buffer[table_offset:])
+    return FrozenSliceMap(
+        keys,
+        ValueTable(codes, table),
+        missing,
+        include="end" if include_end else "start",
+        raise_missing=bool(raise_missing),
+    )
+
+
+def save(frozen: FrozenSliceMap, path: str | os.PathLike) -> None:
+    """Save FrozenSliceMap to a file. See ``SliceMap.save``."""
+    _, chunks = _encode(frozen)
+    with open(path, "wb") as f:
+        for offset, chunk in chunks:
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(chunk)
+
+
+def load(path: str | os.PathLike, use_mmap: bool = True) -> FrozenSliceMap:
+    """Open a file saved with ``save`` as FrozenSliceMap. See ``SliceMap.open``."""
+    with open(path, "rb") as f:
+        if use_mmap:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            buffer = memoryview(f.read())
+    return _decode(buffer, f"File {path}")
+
+
+def _shared_memory() -> Any:
+    """Import ``multiprocessing.shared_memory``, which is available from Python 3.8."""
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError("Sharing SliceMap between processes requires Python 3.8 or newer") from None
+    return shared_memory
+
+
+def share(frozen: FrozenSliceMap, name: str | None = None) -> Any:
+    """Copy FrozenSliceMap to a new shared memory block. See ``SliceMap.share``."""
+    shared_memory = _shared_memory()
+    size, chunks = _encode(frozen)
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    for offset, chunk in chunks:
+        shm.buf[offset : offset + len(chunk)] = chunk
+    _published_names.add(shm._name)  # type: ignore[attr-defined]
+    return shm
+
+
+def attach(name: str) -> FrozenSliceMap:
+    """Attach to FrozenSliceMap in a shared memory block. See ``SliceMap.attach``."""
+    shared_memory = _shared_memory()
+    # Blocks are registered with the resource tracker of the process that opens them and
+    # unlinked when it exits, but only the process that called ``share`` owns the block
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix" and shm._name not in _published_names:  # type: ignore[attr-defined]
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    frozen = _decode(shm.buf.toreadonly(), f"Shared memory {name}")
+    frozen._buffer_owner = shm
+    return frozen
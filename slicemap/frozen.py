@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import logging
+import os
+from typing import Any, Iterable, Iterator, Sequence, SupportsFloat
+
+from .slicemap import (
+    Slice,
+    SliceMap,
+    _bool_array,
+    _float_values,
+    _format_slices,
+    _get_many,
+    _object_array,
+    np,
+)
+from .storage import Slicer
+
+
+class FrozenSliceMap:
+    """Immutable, hashable snapshot of SliceMap, optimized for querying.
+
+    Create it with ``SliceMap.freeze()``. Boundaries, values and missing flags are
+    kept in contiguous, parallel sequences and searched with C-level ``bisect``,
+    without creating any objects. Querying is a few times faster than with SliceMap.
+
+    FrozenSliceMap supports the read-only part of SliceMap's API.
+    """
+
+    __slots__ = ("keys", "values", "missing", "include", "raise_missing", "_hash", "_buffer_owner", "_numpy", "_floats")
+
+    def __init__(
+        self,
+        keys: Sequence[SupportsFloat],
+        values: Sequence[Any],
+        missing: Sequence[bool],
+        include: str = "start",
+        raise_missing: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        keys
+            Sorted, finite slice boundaries. The last slice always ends at ``inf``,
+            so there is one more slice than boundaries.
+        values
+            Value of each slice.
+        missing
+            Whether each slice was not set.
+        include
+            See ``SliceMap.__init__``.
+        raise_missing
+            See ``SliceMap.__init__``.
+        """
+        assert include in ("start", "end"), "Possible `include` values: start | end"
+        assert len(keys) + 1 == len(values) == len(missing), "There must be one more value than keys"
+
+        self.keys = keys
+        self.values = values
+        self.missing = missing
+        self.include = include
+        self.raise_missing = raise_missing
+        self._hash = None
+        self._buffer_owner: Any = None
+        self._numpy: tuple[Any, Any, Any] | None = None
+        self._floats: tuple[Any, Any] | None = None
+
+    def __del__(self) -> None:
+        # Shared memory can be closed only after the views into it are released
+        owner = self._buffer_owner
+        if owner is not None:
+            self.keys = self.values = self.missing = ()
+            self._buffer_owner = None
+            try:
+                owner.close()
+            except BufferError:
+                pass  # The views are still referenced elsewhere
+
+    def __setitem__(self, slice_key: slice, value: Any) -> None:
+        raise TypeError("FrozenSliceMap does not support item assignment")
+
+    def __getitem__(self, key: SupportsFloat | slice) -> Any:
+        """Check the value under the given key. See ``SliceMap.__getitem__``."""
+        keys = self.keys
+        search_op = bisect.bisect_right if self.include == "start" else bisect.bisect_left
+
+        if isinstance(key, slice):
+            if key.start is None or key.start == -float("inf"):
+                idx1 = 0
+            else:
+                idx1 = search_op(keys, key.start)
+
+            if key.stop is None or key.stop == float("inf"):
+                idx2 = len(keys)
+            else:
+                idx2 = search_op(keys, key.stop)
+            return tuple(self._maybe_get_value(i, key) for i in range(idx1, idx2 + 1))
+
+        idx = search_op(keys, key)
+        if self.raise_missing and self.missing[idx]:
+            raise KeyError(f"Key {key} not set in SliceMap!")
+        return self.values[idx]
+
+    def _maybe_get_value(self, idx: int, key: SupportsFloat | slice):
+        if self.raise_missing and self.missing[idx]:
+            raise KeyError(f"Key {key} not set in SliceMap!")
+        return self.values[idx]
+
+    def get_many(self, keys: Iterable[SupportsFloat], assume_sorted: bool = False) -> Any:
+        """Check the values under many keys at once. See ``SliceMap.get_many``.
+
+        For NumPy array of keys, boundaries, values and missing flags are converted
+        to NumPy arrays by the first call and reused by the next ones.
+        """
+        if np is not None and isinstance(keys, np.ndarray):
+            boundaries, values, missing = self._arrays()
+        else:
+            boundaries, values, missing = self.keys, self.values, self.missing
+        return _get_many(boundaries, values, missing, keys, self.include, self.raise_missing, assume_sorted)
+
+    def _arrays(self) -> tuple[Any, Any, Any]:
+        """Return boundary keys, values and missing flags as NumPy arrays, created on the first call."""
+        if self._numpy is None:
+            # Float boundaries, like in SliceMap, so keys are searched without casting all boundaries
+            keys = np.array(self.keys, dtype=float)
+            self._numpy = (keys, _object_array(self.values), _bool_array(self.missing))
+        return self._numpy
+
+    def _float_arrays(self) -> tuple[Any, Any]:
+        """Return start keys of bounded slices and values as float arrays. See ``SliceMap._float_arrays``."""
+        if self._floats is None:
+            self._floats = (self._arrays()[0], _float_values(self.values, self.missing))
+        return self._floats
+
+    def get_slice_at(self, key: SupportsFloat) -> Slice:
+        """Check the slice at the given key."""
+        keys = self.keys
+        if key == float("inf"):
+            idx = len(keys)
+        elif key == -float("inf"):
+            idx = 0
+        elif self.include == "start":
+            idx = bisect.bisect_right(keys, key)
+        else:
+            idx = bisect.bisect_left(keys, key)
+
+        start = keys[idx - 1] if idx > 0 else -float("inf")
+        end = keys[idx] if idx < len(keys) else float("inf")
+        return Slice(start, end, self.values[idx])
+
+    def export(self) -> list[Slice]:
+        """Export FrozenSliceMap as list of tuples. See ``SliceMap.export``."""
+        return list(self._iter_slices())
+
+    def _iter_slices(self) -> Iterator[Slice]:
+        """Iterate over all slices, without copying them."""
+        starts = itertools.chain((-float("inf"),), self.keys)
+        ends = itertools.chain(self.keys, (float("inf"),))
+        return map(Slice._make, zip(starts, ends, self.values))
+
+    def save(self, path: str | os.PathLike) -> None:
+        """Save FrozenSliceMap to a binary file. See ``SliceMap.save``."""
+        from .fileformat import save
+
+        save(self, path)
+
+    def thaw(self) -> SliceMap:
+        """Return a new, mutable SliceMap with the same slices."""
+        sm = SliceMap(include=self.include, raise_missing=self.raise_missing)
+        sm.data.clear()
+        keys = [*self.keys, float("inf")]
+        sm.data.update(Slicer(*x) for x in zip(keys, self.values, map(bool, self.missing)))
+        return sm
+
+    def __len__(self) -> int:
+        """Return the number of slices. See ``SliceMap.__len__``."""
+        return len(self.keys)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FrozenSliceMap):
+            return NotImplemented
+        return self._state() == other._state()
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(self._state())
+        return self._hash
+
+    def _state(self) -> tuple:
+        return self.include, self.raise_missing, tuple(self.keys), tuple(self.values), bytes(self.missing)
+
+    def __repr__(self) -> str:
+        return "FrozenSliceMap(" + _format_slices(self._iter_slices(), self.include) + ")"
+
+    def plot(self) -> None:
+        """If matplotlib is installed: plots FrozenSliceMap. See ``plot_slicemap``."""
+        try:
+            from slicemap import plot_slicemap
+
+            return plot_slicemap(self) if len(self) > 0 else None
+        except ImportError:
+            logging.error("FrozenSliceMap.plot requires matplotlib to be installed! Run `pip install matplotlib`")
@@ -0,0 +1,116 @@
+"""Static indexes over slices of SliceMap, answering range queries in ``O(log(n))``.
+
+Indexes are built lazily from the current slices, on the first query that needs
+them, and dropped by SliceMap whenever it's modified.
+"""
+
+from __future__ import annotations
+
+import bisect
+import operator
+from typing import Any, Callable, Sequence
+
+AGGREGATE_OPS: dict[str, Callable[[Any, Any], Any]] = {
+    "min": min,
+    "max": max,
+    "sum": operator.add,
+}
+
+
+class SegmentTree:
+    """Segment tree combining ranges of elements with an associative operation.
+
+    The operation doesn't have to be commutative. Elements equal to None are
+    skipped, so None is returned for ranges without any other elements.
+    """
+
+    __slots__ = ("op", "size", "tree")
+
+    def __init__(self, elements: Sequence[Any], op: Callable[[Any, Any], Any]):
+        self.op = op
+        self.size = len(elements)
+        self.tree = [None] * self.size + list(elements)
+        for idx in range(self.size - 1, 0, -1):
+            self.tree[idx] = self._combine(self.tree[2 * idx], self.tree[2 * idx + 1])
+
+    def _combine(self, left: Any, right: Any) -> Any:
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return self.op(left, right)
+
+    def query(self, start: int, stop: int) -> Any:
+        """Combine elements from index start (inclusive) to stop (exclusive)."""
+        tree = self.tree
+        left = right = None
+        start += self.size
+        stop += self.size
+        while start < stop:
+            if start & 1:
+                left = self._combine(left, tree[start])
+                start += 1
+            if stop & 1:
+                stop -= 1
+                right = self._combine(tree[stop], right)
+            start >>= 1
+            stop >>= 1
+        return self._combine(left, right)
+
+
+class PrefixSums:
+    """Prefix sums of a step function, for integrating it over any range in ``O(log(n))``.
+
+    Slices that were not set or set to None count as zero and are not included in
+    the measured length.
+    """
+
+    __slots__ = ("keys", "values", "weights", "integrals", "measures")
+
+    def __init__(self, keys: Sequence[Any], values: Sequence[Any], missing: Sequence[bool]):
+        """
+        Parameters
+        ----------
+        keys
+            Sorted, finite slice boundaries.
+        values
+            Value of each slice, one more than keys.
+        missing
+            Whether each slice was not set.
+        """
+        self.keys = keys
+        self.values = [0 if is_missing or value is None else value for value, is_missing in zip(values, missing)]
+        self.weights = [0 if is_missing or value is None else 1 for value, is_missing in zip(values, missing)]
+
+        # Integrals and measured lengths from the first boundary up to each boundary
+        self.integrals = [0]
+        self.measures = [0]
+        for idx in range(1, len(keys)):
+            length = keys[idx] - keys[idx - 1]
+            self.integrals.append(self.integrals[-1] + self.values[idx] * length)
+            self.measures.append(self.measures[-1] + self.weights[idx] * length)
+
+    def integral(self, start: Any, stop: Any) -> Any:
+        """Integrate the values from start to stop."""
+        integrals, values = self.integrals, self.values
+        return self._cumulative(integrals, values, stop) - self._cumulative(integrals, values, start)
+
+    def measure(self, start: Any, stop: Any) -> Any:
+        """Return the length of keys from start to stop belonging to slices that were set to values."""
+        measures, weights = self.measures, self.weights
+        return self._cumulative(measures, weights, stop) - self._cumulative(measures, weights, start)
+
+    def _cumulative(self, prefix: list[Any], per_slice: list[Any], key: Any) -> Any:
+        """Integrate from the first boundary (or from 0, if there are none) to key."""
+        keys = self.keys
+        if not keys:
+            return _scaled(per_slice[0], key)
+        idx = bisect.bisect_right(keys, key)
+        if idx == 0:
+            return -_scaled(per_slice[0], keys[0] - key)
+        return prefix[idx - 1] + _scaled(per_slice[idx], key - keys[idx - 1])
+
+
+def _scaled(value: Any, length: Any) -> Any:
+    """Multiply value by length, keeping zero values zero for infinite lengths."""
+    return value * length if value else 0
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+
+class Instrumentation:
+    """Collects statistics of SliceMap operations.
+
+    Pass it to ``SliceMap(instrumentation=...)`` and read the numbers with
+    ``SliceMap.stats()``. When SliceMap has no instrumentation, nothing is recorded
+    and operations are not slowed down. Subclass it and override ``on_insert`` and
+    ``on_lookup`` to forward the numbers elsewhere, e.g. to a metrics pipeline.
+
+    Latency histograms map an upper bound in nanoseconds (a power of two) to the
+    number of operations that took less than that long.
+    """
+
+    def __init__(self, latency: bool = False):
+        """
+        Parameters
+        ----------
+        latency
+            If True, latency of each operation is measured and collected in histograms.
+            This requires two extra ``time.perf_counter_ns`` calls per operation.
+        """
+        self.latency = latency
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counters to zero."""
+        self.inserts = 0
+        self.removed_boundaries = 0
+        self.removed_per_insert: dict[int, int] = {}
+        self.lookups = 0
+        self.misses = 0
+        self.range_lookups = 0
+        self.insert_latency: dict[int, int] = {}
+        self.lookup_latency: dict[int, int] = {}
+
+    def start(self) -> int | None:
+        """Return the time an operation started, if latency is measured."""
+        return time.perf_counter_ns() if self.latency else None
+
+    def on_insert(self, removed: int, started: int | None) -> None:
+        """Record an insert that removed ``removed`` covered boundaries."""
+        self.inserts += 1
+        self.removed_boundaries += removed
+        self.removed_per_insert[removed] = self.removed_per_insert.get(removed, 0) + 1
+        if started is not None:
+            _record_latency(self.insert_latency, started)
+
+    def on_lookup(self, misses: int, started: int | None, count: int = 1) -> None:
+        """Record ``count`` point lookups, ``misses`` of which hit a slice that was not set."""
+        self.lookups += count
+        self.misses += misses
+        if started is not None:
+            _record_latency(self.lookup_latency, started)
+
+    def on_range_lookup(self, started: int | None) -> None:
+        """Record a lookup of all values in a range of keys."""
+        self.range_lookups += 1
+        if started is not None:
+            _record_latency(self.lookup_latency, started)
+
+    def report(self) -> dict[str, Any]:
+        """Return all counters as a dictionary."""
+        report = {
+            "inserts": self.inserts,
+            "removed_boundaries": self.removed_boundaries,
+            "removed_per_insert": dict(sorted(self.removed_per_insert.items())),
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "range_lookups": self.range_lookups,
+        }
+        if self.latency:
+            report["insert_latency_ns"] = dict(sorted(self.insert_latency.items()))
+            report["lookup_latency_ns"] = dict(sorted(self.lookup_latency.items()))
+        return report
+
+
+def _record_latency(histogram: dict[int, int], started: int) -> None:
+    bucket = 1 << (time.perf_counter_ns() - started).bit_length()
+    histogram[bucket] = histogram.get(bucket, 0) + 1
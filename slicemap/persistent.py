@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import random
+from typing import Any, Iterator, SupportsFloat
+
+from .slicemap import Slice, _format_slices
+
+# Priorities of treap nodes, drawn without affecting the state of the global random generator
+_random = random.Random()
+
+
+class _Node:
+    """Immutable node of a treap. Modifications create new nodes (path copying)."""
+
+    __slots__ = ("key", "value", "missing", "priority", "left", "right")
+
+    def __init__(
+        self,
+        key: SupportsFloat,
+        value: Any,
+        missing: bool,
+        priority: float,
+        left: _Node | None = None,
+        right: _Node | None = None,
+    ):
+        self.key = key
+        self.value = value
+        self.missing = missing
+        self.priority = priority
+        self.left = left
+        self.right = right
+
+    def with_children(self, left: _Node | None, right: _Node | None) -> _Node:
+        return _Node(self.key, self.value, self.missing, self.priority, left, right)
+
+
+def _split(node: _Node | None, key: SupportsFloat, inclusive: bool) -> tuple[_Node | None, _Node | None]:
+    """Split into nodes with keys below key (or equal, if inclusive) and the remaining ones."""
+    if node is None:
+        return None, None
+    if node.key < key or (inclusive and node.key == key):  # type: ignore
+        left, right = _split(node.right, key, inclusive)
+        return node.with_children(node.left, left), right
+    left, right = _split(node.left, key, inclusive)
+    return left, node.with_children(right, node.right)
+
+
+def _merge(left: _Node | None, right: _Node | None) -> _Node | None:
+    """Merge two treaps, all keys in left must be smaller than keys in right."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        return left.with_children(left.left, _merge(left.right, right))
+    return right.with_children(_merge(left, right.left), right.right)
+
+
+def _count(node: _Node | None) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            count += 1
+            stack.append(node.left)
+            stack.append(node.right)
+    return count
+
+
+class SliceMapVersion:
+    """Read-only version of PersistentSliceMap.
+
+    Supports the read-only part of SliceMap's API. Versions share all unchanged
+    slices with each other, so keeping many of them is cheap.
+    """
+
+    def __init__(self, root: _Node, length: int, version: int, include: str, raise_missing: bool):
+        self._root = root
+        self._length = length
+        self.version = version
+        self.include = include
+        self.raise_missing = raise_missing
+
+    def _find(self, key: SupportsFloat) -> tuple[SupportsFloat, _Node]:
+        """Find the node of the slice at key and the start of this slice."""
+        strict = self.include == "start" and key != float("inf")
+        node: _Node | None = self._root
+        found = self._root
+        start = -float("inf")
+        while node is not None:
+            if node.key > key if strict else node.key >= key:  # type: ignore
+                found = node
+                node = node.left
+            else:
+                start = node.key
+                node = node.right
+        return start, found
+
+    def _iter_nodes(self, key: SupportsFloat | None = None) -> Iterator[_Node]:
+        """Iterate over nodes in order, starting from the slice at key."""
+        strict = self.include == "start"
+        stack = []
+        node: _Node | None = self._root
+        while node is not None:
+            if key is None or (node.key > key if strict else node.key >= key):  # type: ignore
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            yield node
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def _maybe_get_value(self, node: _Node, key: SupportsFloat | slice) -> Any:
+        if self.raise_missing and node.missing:
+            raise KeyError(f"Key {key} not set in SliceMap!")
+        return node.value
+
+    def __getitem__(self, key: SupportsFloat | slice) -> Any:
+        """Check the value under the given key. See ``SliceMap.__getitem__``."""
+        if isinstance(key, slice):
+            start = None if key.start == -float("inf") else key.start
+            last = None if key.stop is None or key.stop == float("inf") else self._find(key.stop)[1]
+            values = []
+            for node in self._iter_nodes(start):
+                if last is not None and node.key > last.key:  # type: ignore
+                    break
+                values.append(self._maybe_get_value(node, key))
+                if node is last:
+                    break
+            return tuple(values)
+        return self._maybe_get_value(self._find(key)[1], key)
+
+    def get_slice_at(self, key: SupportsFloat) -> Slice:
+        """Check the slice at the given key."""
+        start, node = self._find(key)
+        return Slice(start, node.key, node.value)
+
+    def export(self) -> list[Slice]:
+        """Export as list of tuples. See ``SliceMap.export``."""
+        slices = []
+        start = -float("inf")
+        for node in self._iter_nodes():
+            slices.append(Slice(start, node.key, node.value))
+            start = node.key
+        return slices
+
+    def __len__(self) -> int:
+        """Return the number of slices. See ``SliceMap.__len__``."""
+        return self._length
+
+    def __repr__(self) -> str:
+        return _format_slices(self.export(), self.include)
+
+
+class PersistentSliceMap(SliceMapVersion):
+    """SliceMap that keeps its previous versions.
+
+    Each insertion creates a new version, but only copies ``O(log(n))`` nodes of
+    the underlying balanced tree (treap), sharing the rest with the previous
+    version. Querying PersistentSliceMap queries its latest version. Use ``at``
+    to query any retained version.
+    """
+
+    def __init__(
+        self,
+        include: str = "start",
+        raise_missing: bool = False,
+        max_versions: int | None = None,
+    ):
+        """
+        Parameters
+        ----------
+        include
+            See ``SliceMap.__init__``.
+        raise_missing
+            See ``SliceMap.__init__``.
+        max_versions
+            How many of the latest versions to retain. Older versions are evicted,
+            so their memory can be freed. If None, all versions are retained.
+        """
+        assert include in ("start", "end"), "Possible `include` values: start | end"
+        assert max_versions is None or max_versions >= 1, "At least one version must be retained"
+
+        root = _Node(float("inf"), None, True, _random.random())
+        super().__init__(root, 0, 0, include, raise_missing)
+        self.max_versions = max_versions
+        self._versions = {0: (root, 0)}
+
+    def __setitem__(self, slice_key: slice, value: Any) -> None:
+        """Add a new slice, creating a new version. See ``SliceMap.__setitem__``."""
+        assert isinstance(slice_key, slice)
+        assert slice_key.step == 1 or slice_key.step is None
+        self.set(slice_key.start, slice_key.stop, value)
+
+    def set(self, start: SupportsFloat | None, stop: SupportsFloat | None, value: Any) -> int:
+        """Add a new slice, creating a new version. Returns the number of the new version.
+
+        Empty slices don't create a new version, then the current version is returned.
+        """
+        start = start if start is not None else -float("inf")
+        stop = stop if stop is not None else float("inf")
+        if start >= stop:  # type: ignore
+            return self.version
+
+        below, rest = _split(self._root, start, inclusive=False)
+        covered, above = _split(rest, stop, inclusive=True)
+
+        # The first boundary at or after start holds the value of the slice containing start
+        old = covered if covered is not None else above
+        while old is not None and old.left is not None:
+            old = old.left
+        assert old is not None
+
+        length = self._length - _count(covered) + 1
+        new_tail = _merge(_Node(stop, value, False, _random.random()), above)
+        if start > -float("inf"):  # type: ignore
+            new_tail = _merge(_Node(start, old.value, old.missing, _random.random()), new_tail)
+            length += 1
+        root = _merge(below, new_tail)
+        assert root is not None
+
+        self._root = root
+        self._length = length
+        self.version += 1
+        self._versions[self.version] = (root, length)
+        if self.max_versions is not None:
+            while len(self._versions) > self.max_versions:
+                del self._versions[next(iter(self._versions))]
+        return self.version
+
+    def at(self, version: int) -> SliceMapVersion:
+        """Return a read-only version of the map.
+
+        Raises
+        ------
+        KeyError
+            If the version doesn't exist or was evicted.
+        """
+        if version not in self._versions:
+            raise KeyError(f"Version {version} not retained in PersistentSliceMap!")
+        root, length = self._versions[version]
+        return SliceMapVersion(root, length, version, self.include, self.raise_missing)
+
+    def versions(self) -> list[int]:
+        """Return numbers of all retained versions, from the oldest."""
+        return list(self._versions)
+
+    def evict(self, before: int) -> None:
+        """Evict all versions older than ``before``. The latest version is never evicted."""
+        for version in list(self._versions):
+            if version < before and version != self.version:
+                del self._versions[version]
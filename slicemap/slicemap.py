@@ -1,22 +1,30 @@
 from __future__ import annotations
 
+import bisect
 import logging
+import operator
+import os
 from collections import namedtuple
 from copy import deepcopy
-from dataclasses import dataclass
-from typing import Any, SupportsFloat
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Sequence, SupportsFloat
 
 from sortedcontainers import SortedList
 
+from .indexes import AGGREGATE_OPS, PrefixSums, SegmentTree, _scaled
+from .instrumentation import Instrumentation
+from .storage import Slicer, SlicerArray, SlicerTree, storage_nbytes
 
-@dataclass
-class Slicer:
-    up_to_key: SupportsFloat
-    value: Any = None
-    missing: bool = False
+if TYPE_CHECKING:
+    from .frozen import FrozenSliceMap
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 Slice = namedtuple("Slice", ["start", "end", "value"])
+Measure = namedtuple("Measure", ["length", "count", "unbounded"])
 
 
 class SliceMap:
@@ -24,6 +32,14 @@ class SliceMap:
         self,
         include: str = "start",
         raise_missing: bool = False,
+        storage: str = "sortedlist",
+        coalesce: bool = False,
+        value_eq: Callable[[Any, Any], bool] = operator.eq,
+        instrumentation: Instrumentation | None = None,
+        lookup_cache: bool = False,
+        intern_values: bool = False,
+        track_measures: bool = False,
+        index_values: bool = False,
     ):
         """
         SliceMap is like dict that allows setting values for whole slices of keys.
@@ -41,27 +57,761 @@ class SliceMap:
         raise_missing
             If True, accessing a key that was not set will raise KeyError. If False,
             accessing a key that was not set will return None.
+        storage
+            Either "sortedlist", "array" or "tree". If "sortedlist", slices are stored
+            as objects in SortedList. If "array", slices are stored in compact parallel
+            arrays, which uses much less memory and speeds up searching, but makes
+            insertions ``O(n)`` (fast memmove). With "array", keys are stored as floats.
+            If "tree", slices are stored in a balanced tree that keeps aggregates of
+            numeric values up to date with each insertion, so ``aggregate``, ``integrate``
+            and ``mean`` take ``O(log(n))`` time even if SliceMap is modified between queries.
+            Other operations are a few times slower than with "sortedlist".
+        coalesce
+            If True, a new slice will be merged with its neighbours if they have
+            equal values. This keeps SliceMap small when the same value is set for
+            adjacent slices. The merged slice takes the newly set value, so keys of
+            merged neighbours map to it too. See also ``compact``.
+        value_eq
+            Predicate deciding if two values are equal, used with ``coalesce=True``
+            and in ``compact``. By default, values are compared with ``==``, so e.g.
+            ``1`` and ``1.0`` are merged.
+        instrumentation
+            If given, it will collect statistics of inserts and lookups, available
+            with ``stats``. If None, nothing is collected and there is no overhead.
+        lookup_cache
+            If True, point queries first check the slice returned by the previous
+            query and its neighbours, before falling back to binary search. This
+            speeds up querying when consecutive keys are close to each other.
+        intern_values
+            If True, equal values (of the same type) are stored as a single object
+            and get stable integer codes, see ``codes``. Values must be hashable.
+        track_measures
+            If True, the total length and the number of slices mapped to each value
+            are updated with each modification, see ``measure``. Values must be hashable.
+        index_values
+            If True, slices of each value are kept in a reverse index, updated with
+            each modification, see ``find``. Values must be hashable.
 
         """
         assert include in ("start", "end"), "Possible `include` values: start | end"
+        assert storage in ("sortedlist", "array", "tree"), "Possible `storage` values: sortedlist | array | tree"
 
-        self.data = SortedList(key=lambda x: x.up_to_key)
-        self.data.add(Slicer(up_to_key=float("inf"), value=None, missing=True))
+        self.storage = storage
+        self.data = self._new_storage([Slicer(up_to_key=float("inf"), value=None, missing=True)])
+        self._data_refs = [1]
         self.raise_missing = raise_missing
         self.include = include
+        self.coalesce = coalesce
+        self.value_eq = value_eq
+        self.instrumentation = instrumentation
+        self.lookup_cache = lookup_cache
+        self._finger: tuple | None = None
+        self._indexes: dict[Any, Any] = {}
+        self.intern_values = intern_values
+        self._value_table: list[Any] = []
+        self._value_codes: dict[Any, int] = {}
+        self.track_measures = track_measures
+        self._measures: dict[Any, tuple] = {}
+        self.index_values = index_values
+        self._value_index: dict[Any, SortedList] = {}
+
+    @classmethod
+    def from_slices(
+        cls,
+        slices: Iterable[tuple[SupportsFloat | None, SupportsFloat | None, Any]],
+        **kwargs: Any,
+    ) -> "SliceMap":
+        """Build SliceMap from an ordered iterable of ``(start, stop, value)`` tuples.
+
+        The result is the same as setting ``sm[start:stop] = value`` for each tuple
+        in order, so later slices overwrite earlier ones. See ``update`` for details.
+
+        Parameters
+        ----------
+        slices
+            Iterable of ``(start, stop, value)`` tuples. ``None`` as start or stop
+            means an unbounded slice.
+        kwargs
+            Passed to ``SliceMap.__init__``.
+        """
+        sm = cls(**kwargs)
+        sm.update(slices)
+        return sm
+
+    @classmethod
+    def build_parallel(
+        cls,
+        chunks: Iterable[Any],
+        workers: int | None = None,
+        load: Callable[[Any], Iterable[tuple[SupportsFloat | None, SupportsFloat | None, Any]]] | None = None,
+        **kwargs: Any,
+    ) -> "SliceMap":
+        """Build SliceMap from chunks of slices in parallel, using a pool of processes.
+
+        Each chunk is built into a partial SliceMap in a worker process, like with
+        ``from_slices``. Partial SliceMaps are then merged in the order of chunks,
+        each in a single ``O(n + m)`` merge of boundaries, so slices from later chunks
+        overwrite slices from earlier ones. The result is the same as building
+        SliceMap from all chunks concatenated.
+
+        Parameters
+        ----------
+        chunks
+            Iterable of chunks. Each chunk is an ordered iterable of ``(start, stop, value)``
+            tuples or, if ``load`` is given, anything ``load`` accepts. Chunks are sent
+            to worker processes, so they must be picklable.
+        workers
+            The number of worker processes. If None, the number of CPUs is used.
+        load
+            If given, it's called with each chunk in a worker process and should return
+            its slices, e.g. read from a file. It must be picklable, e.g. a function
+            defined at the top level of a module.
+        kwargs
+            Passed to ``SliceMap.__init__``.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partial_columns = list(executor.map(_build_columns, chunks, repeat(load)))
+
+        while len(partial_columns) > 1:
+            merged = [_merge_columns(x, y, None) for x, y in zip(partial_columns[::2], partial_columns[1::2])]
+            partial_columns = merged + partial_columns[len(merged) * 2 :]
+
+        sm = cls(**kwargs)
+        if partial_columns:
+            sm._set_columns(*partial_columns[0])
+        return sm
+
+    def update(self, slices: Iterable[tuple[SupportsFloat | None, SupportsFloat | None, Any]]) -> None:
+        """Add many slices at once, in order. Later slices overwrite earlier ones.
+
+        Instead of inserting slices one by one, final boundaries are computed in a
+        single sweep and the underlying list is rebuilt once. This operation has
+        ``O((n + m)*log(n + m))`` time complexity, where ``m`` is the number of new slices.
+
+        Parameters
+        ----------
+        slices
+            Iterable of ``(start, stop, value)`` tuples. ``None`` as start or stop
+            means an unbounded slice.
+        """
+        # Existing slices are the oldest writes, they cover all keys
+        writes = []
+        prev_key = -float("inf")
+        for slicer in self.data:
+            writes.append((prev_key, slicer.up_to_key, slicer.value, slicer.missing))
+            prev_key = slicer.up_to_key
+
+        new_writes = []
+        for start, stop, value in slices:
+            start = start if start is not None else -float("inf")
+            stop = stop if stop is not None else float("inf")
+            if start < stop:
+                new_writes.append((start, stop, value, False))
+        self._check_hashable(value for _, _, value, _ in new_writes)
+        if self.intern_values:
+            if self._data_refs[0] > 1:
+                self._unshare()
+            new_writes = [(start, stop, self._intern(value), False) for start, stop, value, _ in new_writes]
+        writes.extend(new_writes)
+
+        coords = sorted({key for start, stop, _, _ in writes for key in (start, stop)})
+        coord_idx = {key: idx for idx, key in enumerate(coords)}
+
+        # Paint elementary intervals starting from the newest write; each interval is
+        # painted once, ``next_free`` is a union-find pointing to the next unpainted one
+        num_intervals = len(coords) - 1
+        painted_by = [0] * num_intervals
+        next_free = list(range(num_intervals + 1))
+
+        for write_idx in range(len(writes) - 1, -1, -1):
+            start, stop, _, _ = writes[write_idx]
+            idx = coord_idx[start]
+            end_idx = coord_idx[stop]
+            while True:
+                root = idx
+                while next_free[root] != root:
+                    root = next_free[root]
+                while next_free[idx] != root:
+                    next_free[idx], idx = root, next_free[idx]
+                idx = root
+                if idx >= end_idx:
+                    break
+                painted_by[idx] = write_idx
+                next_free[idx] = idx + 1
+
+        slicers = []
+        ages = []
+        for idx in range(num_intervals):
+            write_idx = painted_by[idx]
+            if idx + 1 == num_intervals or painted_by[idx + 1] != write_idx:
+                _, _, value, missing = writes[write_idx]
+                slicers.append(Slicer(up_to_key=coords[idx + 1], value=value, missing=missing))
+                ages.append(write_idx)
+
+        if self.coalesce:
+            slicers = self._compacted(slicers, ages)
+        self._replace_data(slicers)
+
+    def compact(self) -> None:
+        """Merge all adjacent slices with equal values.
+
+        Equality is decided by ``value_eq`` given during SliceMap initialization.
+        Each merged slice takes the value of the first of the merged slices.
+        Slices that were not set are never merged with slices that were set.
+        This operation has ``O(n)`` time complexity.
+        """
+        slicers = self._compacted(list(self.data))
+        if len(slicers) != len(self.data):
+            self._replace_data(slicers)
+
+    def _new_storage(self, slicers: Iterable[Slicer] = ()) -> Any:
+        if self.storage == "sortedlist":
+            return SortedList(slicers, key=lambda x: x.up_to_key)
+        if self.storage == "tree":
+            return SlicerTree(slicers)
+        return SlicerArray(slicers)
+
+    def _replace_data(self, slicers: list[Slicer]) -> None:
+        """Replace all slices. Storage shared with snapshots is left intact."""
+        self._finger = None
+        self._indexes = {}
+        self._data_refs[0] -= 1
+        self._data_refs = [1]
+        self.data = self._new_storage(slicers)
+        if self.track_measures or self.index_values:
+            self._measures = {}
+            self._value_index = {}
+            self._track(0, len(self.data) - 1, 1)
+
+    def _unshare(self) -> None:
+        """Copy storage and interned values shared with snapshots before they're modified."""
+        self._data_refs[0] -= 1
+        self._data_refs = [1]
+        self.data = self.data.copy()
+        self._value_index = {value: slices.copy() for value, slices in self._value_index.items()}
+        self._value_table = self._value_table.copy()
+        self._value_codes = self._value_codes.copy()
+
+    def _compacted(self, slicers: list[Slicer], ages: Sequence[int] | None = None) -> list[Slicer]:
+        """Merge runs of adjacent slices with equal values.
+
+        Each run takes the value of its newest slice according to ages (the first of
+        the newest ones) or, without ages, the value of its first slice.
+        """
+        compacted = []
+        run_start = 0
+        for idx in range(1, len(slicers) + 1):
+            if idx < len(slicers) and self._mergeable(slicers[idx - 1], slicers[idx]):
+                continue
+            kept = run_start if ages is None else max(range(run_start, idx), key=ages.__getitem__)
+            slicer = slicers[kept]
+            if kept != idx - 1:
+                slicer = Slicer(up_to_key=slicers[idx - 1].up_to_key, value=slicer.value, missing=slicer.missing)
+            compacted.append(slicer)
+            run_start = idx
+        return compacted
+
+    def _coalesce(self, first: int, last: int) -> None:
+        """Merge slices from index first to last, which were just set, with each other and their neighbours.
+
+        Merged slices take the values of the slices that were just set.
+        """
+        data = self.data
+        window_start = max(first - 1, 0)
+        window_stop = min(last + 2, len(data))
+        slicers = list(data.islice(window_start, window_stop))
+        ages = [int(first <= idx <= last) for idx in range(window_start, window_stop)]
+        compacted = self._compacted(slicers, ages)
+        if len(compacted) != len(slicers):
+            del data[window_start:window_stop]
+            for slicer in compacted:
+                data.add(slicer)
+
+    def _mergeable(self, slicer: Slicer, next_slicer: Slicer) -> bool:
+        if slicer.missing or next_slicer.missing:
+            return slicer.missing and next_slicer.missing
+        return bool(self.value_eq(slicer.value, next_slicer.value))
+
+    def _check_hashable(self, values: Iterable[Any]) -> None:
+        """Raise TypeError for unhashable values, before they're set, if values are kept in dictionaries."""
+        if self.track_measures or self.index_values or self.intern_values:
+            for value in values:
+                hash(value)
+
+    def _intern(self, value: Any) -> Any:
+        """Return the stored value equal to the given one, storing it if it's new."""
+        code = self._value_codes.get((type(value), value))
+        if code is None:
+            code = self._value_codes[type(value), value] = len(self._value_table)
+            self._value_table.append(value)
+        return self._value_table[code]
+
+    def copy(self, deep: bool = True) -> "SliceMap":
+        """Returns a copy of itself.
+
+        Parameters
+        ----------
+        deep
+            If True, returns a deepcopy, copying the values too. If False, returns
+            a copy-on-write snapshot, see ``snapshot``. In both cases, ``instrumentation``
+            is shared with the copy, not copied. A deep copy starts with empty
+            caches, they are rebuilt on demand.
+        """
+        if not deep:
+            return self.snapshot()
+
+        # Instrumentation may hold locks or clients of a metrics pipeline that can't be copied.
+        # Caches and the finger are replaced rather than copied, they are as large as the data
+        memo = {id(self.instrumentation): self.instrumentation, id(self._indexes): {}}
+        if self._finger is not None:
+            memo[id(self._finger)] = None
+        new = deepcopy(self, memo)
+        new._data_refs = [1]
+        return new
+
+    def snapshot(self) -> "SliceMap":
+        """Returns a copy-on-write copy of itself in ``O(1)`` time.
+
+        The copy shares storage with the original until one of them is modified.
+        Then the modified one copies the storage in ``O(n)`` time. Values are
+        not copied, so mutable values are shared between the two. If SliceMap
+        has ``instrumentation``, it is shared too.
+        """
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new._finger = None
+        new._indexes = dict(self._indexes)
+        new._measures = dict(self._measures)
+        self._data_refs[0] += 1
+        return new
+
+    def overlay(self, other: SliceMap) -> SliceMap:
+        """Return a new SliceMap with slices of the other SliceMap laid over this one.
+
+        Keys set in the other SliceMap map to its values, the remaining keys keep
+        values of this SliceMap. The result is the same as setting all slices of the
+        other SliceMap in a copy of this one, but it's built in a single merge of
+        both boundary sequences, in ``O(n + m)`` time.
+
+        Parameters
+        ----------
+        other
+            SliceMap with the same ``include``.
+        """
+        return self._merged(other, None)
+
+    def zip(self, other: SliceMap) -> SliceMap:
+        """Return a new SliceMap mapping keys to pairs of values from both SliceMaps.
+
+        Same as ``combine`` with a function returning tuples ``(value, other_value)``.
+        """
+        return self._merged(other, lambda value, other_value: (value, other_value))
+
+    def combine(self, other: SliceMap, func: Callable[[Any, Any], Any]) -> SliceMap:
+        """Return a new SliceMap mapping keys to combined values from both SliceMaps.
+
+        Each key set in any of the SliceMaps maps to ``func(self[key], other[key])``,
+        where values of keys that were not set are None. Keys not set in both
+        SliceMaps are not set in the result. The result is built in a single merge of
+        both boundary sequences, in ``O(n + m)`` time, and ``func`` is called once
+        for each part of slices between boundaries of both SliceMaps.
+
+        Parameters
+        ----------
+        other
+            SliceMap with the same ``include``.
+        func
+            Function of two values, returning the value of the result.
+        """
+        return self._merged(other, func)
+
+    def _merged(self, other: SliceMap, func: Callable[[Any, Any], Any] | None) -> SliceMap:
+        """Merge boundaries of both SliceMaps. Without func, overlay the other SliceMap."""
+        assert self.include == other.include, "Both SliceMaps must have the same `include`"
+        result = type(self)(
+            include=self.include,
+            raise_missing=self.raise_missing,
+            storage=self.storage,
+            coalesce=self.coalesce,
+            value_eq=self.value_eq,
+            lookup_cache=self.lookup_cache,
+            intern_values=self.intern_values,
+            track_measures=self.track_measures,
+            index_values=self.index_values,
+        )
+        result._set_columns(*_merge_columns(self._columns(), other._columns(), func))
+        return result
+
+    def _set_columns(self, keys: Sequence, values: Sequence, missing: Sequence) -> None:
+        """Replace all slices with slices given as parallel sequences, ending with ``inf``."""
+        self._check_hashable(value for value, is_missing in zip(values, missing) if not is_missing)
+        if self.intern_values and self._data_refs[0] > 1:
+            self._unshare()
+        if self.intern_values:
+            values = [value if is_missing else self._intern(value) for value, is_missing in zip(values, missing)]
+        slicers = [
+            Slicer(up_to_key=key, value=value, missing=bool(is_missing))
+            for key, value, is_missing in zip(keys, values, missing)
+        ]
+        if self.coalesce:
+            slicers = self._compacted(slicers)
+        self._replace_data(slicers)
+
+    def freeze(self) -> "FrozenSliceMap":
+        """Return an immutable, hashable snapshot of SliceMap, optimized for querying.
+
+        Use it when SliceMap is built once and then queried many times.
+        """
+        from .frozen import FrozenSliceMap
+
+        keys, values, missing = self._columns()
+        return FrozenSliceMap(tuple(keys)[:-1], tuple(values), bytes(missing), self.include, self.raise_missing)
+
+    def save(self, path: str | os.PathLike) -> None:
+        """Save SliceMap to a compact binary file.
+
+        Boundaries are stored as float64 (or int64, if all are integers) array,
+        missing slices as a bitmap and values in a pickled table of distinct values.
+        Open the file with ``SliceMap.open``. Opening unpickles the values, so files
+        must be shared only between trusted parties.
+
+        Parameters
+        ----------
+        path
+            Path of the file to create.
+        """
+        self.freeze().save(path)
+
+    @staticmethod
+    def open(path: str | os.PathLike, mmap: bool = True) -> "FrozenSliceMap":
+        """Open a file created with ``save`` as a read-only FrozenSliceMap.
+
+        With ``mmap=True``, the file is memory-mapped and queried directly, without
+        loading the boundaries into memory. Opening takes constant time, apart from
+        unpickling the table of distinct values, and many processes opening the
+        same file share its memory.
+
+        The table of distinct values is read with ``pickle``, so opening a file from
+        an untrusted source can execute arbitrary code. Open only files you trust.
+
+        Parameters
+        ----------
+        path
+            Path of the file to open.
+        mmap
+            If True, memory-map the file. If False, read it into memory.
+        """
+        from .fileformat import load
 
-    def copy(self) -> "SliceMap":
-        """Returns a deepcopy of itself."""
-        return deepcopy(self)
+        return load(path, use_mmap=mmap)
 
-    def export(self) -> list[Slice]:
+    def share(self, name: str | None = None) -> Any:
+        """Publish SliceMap in a new shared memory block, for other processes to attach.
+
+        Uses the same binary format as ``save``. Pass the name of the returned block
+        to ``SliceMap.attach`` in other processes. The caller owns the block: call
+        its ``close`` and ``unlink`` methods when it's no longer needed. Requires
+        Python 3.8 or newer, raises ImportError otherwise.
+
+        Parameters
+        ----------
+        name
+            Name of the shared memory block. If None, a unique name is generated.
+
+        Returns
+        -------
+        multiprocessing.shared_memory.SharedMemory
+            The created shared memory block. Its name is available as ``name``.
+        """
+        from .fileformat import share
+
+        return share(self.freeze(), name)
+
+    @staticmethod
+    def attach(name: str) -> "FrozenSliceMap":
+        """Attach to SliceMap published with ``share`` as a read-only FrozenSliceMap.
+
+        Boundaries are queried directly in the shared memory, without copying them.
+        Only the table of distinct values is unpickled. Like with ``open``, unpickling
+        can execute arbitrary code, so attach only to blocks published by processes
+        you trust. Attaching doesn't take ownership of the block, it's not unlinked
+        when the attaching process exits. Requires Python 3.8 or newer, like ``share``.
+
+        Parameters
+        ----------
+        name
+            Name of the shared memory block.
+        """
+        from .fileformat import attach
+
+        return attach(name)
+
+    def export(self, as_codes: bool = False) -> Any:
         """Export SliceMap as list of tuples.
 
         This allows using SliceMap's final slices in other parts of your program.
+
+        Parameters
+        ----------
+        as_codes
+            If True, export SliceMap as ``(boundaries, codes, table)`` instead.
+            ``boundaries`` is the list of finite slice boundaries, ``codes`` the list
+            of integer codes of slice values (one more than boundaries) and ``table``
+            the list of distinct values, indexed by codes. See ``codes``.
+
+        Returns
+        -------
+        list[Slice] | tuple[list, list[int], list]
+            Named tuples ``(start, end, value)`` or ``(boundaries, codes, table)``.
+        """
+        if as_codes:
+            boundaries, _, _ = self._columns()
+            slice_codes, table = self._slice_codes()
+            return list(boundaries[:-1]), list(slice_codes), list(table)
+        return list(self.iter_slices())
+
+    def iter_slices(
+        self,
+        start: SupportsFloat | None = None,
+        stop: SupportsFloat | None = None,
+        reverse: bool = False,
+    ) -> Iterator[Slice]:
+        """Iterate over slices overlapping keys from start to stop, without copying them.
+
+        Yields the same slices whose values are returned by ``sm[start:stop]``.
+        Slices are read lazily from the underlying storage, so SliceMap must not be
+        modified during the iteration.
+
+        Parameters
+        ----------
+        start
+            The first key. If None, iteration starts from the first slice.
+        stop
+            The last key. If None, iteration ends at the last slice.
+        reverse
+            If True, slices are yielded from the last to the first.
+
+        Yields
+        ------
+        Slice
+            Named tuples ``(start, end, value)``.
+        """
+        idx1, idx2 = self._range_indices(start, stop)
+        if idx2 < idx1:
+            return
+
+        slicers = iter(self.data.islice(max(idx1 - 1, 0), idx2 + 1, reverse=reverse))
+        if not reverse:
+            prev_key = -float("inf") if idx1 == 0 else next(slicers).up_to_key
+            for slicer in slicers:
+                yield Slice(prev_key, slicer.up_to_key, slicer.value)
+                prev_key = slicer.up_to_key
+        else:
+            slicer = next(slicers)
+            for prev_slicer in slicers:
+                yield Slice(prev_slicer.up_to_key, slicer.up_to_key, slicer.value)
+                slicer = prev_slicer
+            if idx1 == 0:
+                yield Slice(-float("inf"), slicer.up_to_key, slicer.value)
+
+    def _range_indices(self, start: SupportsFloat | None, stop: SupportsFloat | None) -> tuple[int, int]:
+        """Return indices of the first and the last slice overlapping keys from start to stop."""
+        if self.include == "start":
+            search_op = self.data.bisect_right
+        else:
+            search_op = self.data.bisect_left
+
+        if start is None or start == -float("inf"):
+            idx1 = 0
+        else:
+            idx1 = search_op(Slicer(up_to_key=start))
+
+        if stop is None or stop == float("inf"):
+            idx2 = len(self.data) - 1
+        else:
+            idx2 = search_op(Slicer(up_to_key=stop))
+        return idx1, idx2
+
+    def aggregate(
+        self,
+        start: SupportsFloat | None = None,
+        stop: SupportsFloat | None = None,
+        op: str | Callable[[Any, Any], Any] = "max",
+    ) -> Any:
+        """Combine values of slices overlapping keys from start to stop.
+
+        Aggregates the same values that are returned by ``sm[start:stop]``, skipping
+        slices that were not set or set to None.
+
+        With ``storage="tree"``, the minimum, maximum and sum of numeric values are
+        kept up to date with each modification and aggregated in ``O(log(n))`` time.
+        In other cases, values of the ``k`` overlapping slices are combined in ``O(k)``
+        time. Once the slices combined with a given ``op`` since the last modification
+        add up to the number of all slices, a segment tree is built over all slices in
+        ``O(n)`` time and next queries take ``O(log(n))`` time, until SliceMap is modified.
+
+        Parameters
+        ----------
+        start
+            The first key. If None, aggregation starts from the first slice.
+        stop
+            The last key. If None, aggregation ends at the last slice.
+        op
+            Either "min", "max", "sum" or an associative function of two values.
+            The function doesn't have to be commutative.
+
+        Returns
+        -------
+        Any
+            The aggregated value or None, if none of the slices was set.
+        """
+        instrumentation = self.instrumentation
+        started = instrumentation.start() if instrumentation is not None else None
+
+        if isinstance(op, str):
+            assert op in AGGREGATE_OPS, "Possible `op` values: min | max | sum | callable"
+        idx1, idx2 = self._range_indices(start, stop)
+
+        if isinstance(self.data, SlicerTree) and isinstance(op, str):
+            low, high, total, opaque = self.data.aggregates(idx1, idx2 + 1)
+            # Values that are not numbers are not aggregated in the tree
+            result = self._combine(idx1, idx2, op) if opaque else {"min": low, "max": high, "sum": total}[op]
+        else:
+            result = self._combine(idx1, idx2, op)
+        if instrumentation is not None:
+            instrumentation.on_range_lookup(started)
+        return result
+
+    def integrate(self, start: SupportsFloat | None = None, stop: SupportsFloat | None = None) -> Any:
+        """Integrate SliceMap as a step function over keys from start to stop.
+
+        Returns the sum of ``value * length`` of the parts of slices between start
+        and stop. Slices that were not set or set to None count as zero.
+
+        With ``storage="tree"``, sums of ``value * length`` are kept up to date with
+        each modification and queries take ``O(log(n))`` time. In other cases, the
+        ``k`` overlapping slices are summed in ``O(k)`` time. Once the slices summed
+        since the last modification add up to the number of all slices, prefix sums
+        are built over all slices in ``O(n)`` time and next queries take ``O(log(n))``
+        time, until SliceMap is modified.
+
+        Parameters
+        ----------
+        start
+            The lower bound. If None, integration starts at ``-inf``.
+        stop
+            The upper bound. If None, integration ends at ``inf``.
+
+        Returns
+        -------
+        Any
+            The integral. It's infinite if the range includes an unbounded slice
+            with a non-zero value and 0 if ``start >= stop``.
+        """
+        start = start if start is not None else -float("inf")
+        stop = stop if stop is not None else float("inf")
+        if start >= stop:  # type: ignore
+            return 0
+        return self._integrals(start, stop)[0]
+
+    def mean(self, start: SupportsFloat | None = None, stop: SupportsFloat | None = None) -> Any:
+        """Return the length-weighted mean of values over keys from start to stop.
+
+        Only slices that were set to values other than None are taken into account.
+        See ``integrate``.
+
+        Parameters
+        ----------
+        start
+            The lower bound. If None, the mean is computed from ``-inf``.
+        stop
+            The upper bound. If None, the mean is computed up to ``inf``.
+
+        Returns
+        -------
+        Any
+            The mean or None, if none of the keys in the range was set. If the range
+            includes unbounded slices, their value is returned as the limit of the
+            mean, or ``nan`` if both unbounded slices were set with different values.
+        """
+        start = start if start is not None else -float("inf")
+        stop = stop if stop is not None else float("inf")
+        if start >= stop:  # type: ignore
+            return None
+        integral, length = self._integrals(start, stop)
+        if length == 0:
+            return None
+        if length == float("inf"):
+            # Only values of unbounded slices matter in the limit
+            unbounded = [self.data[0]] if start == -float("inf") else []
+            unbounded += [self.data[-1]] if stop == float("inf") else []
+            values = [x.value for x in unbounded if not x.missing and x.value is not None]
+            return values[0] if all(x == values[0] for x in values) else float("nan")
+        return integral / length
+
+    def _combine(self, idx1: int, idx2: int, op: str | Callable[[Any, Any], Any]) -> Any:
+        """Combine values of slices from index idx1 to idx2 by scanning them or with a static index."""
+        func = AGGREGATE_OPS.get(op, op)  # type: ignore
+        tree = self._indexes.get(("aggregate", op))
+        if tree is None and self._should_index(("aggregate", op), idx2 - idx1 + 1):
+            _, values, missing = self._columns()
+            elements = [None if is_missing else value for value, is_missing in zip(values, missing)]
+            tree = self._indexes["aggregate", op] = SegmentTree(elements, func)
+        if tree is not None:
+            return tree.query(idx1, idx2 + 1)
+
+        result = None
+        for slicer in self.data.islice(idx1, idx2 + 1):
+            if not slicer.missing and slicer.value is not None:
+                result = slicer.value if result is None else func(result, slicer.value)
+        return result
+
+    def _should_index(self, name: Any, cost: int) -> bool:
+        """Decide if a static index should be built instead of scanning ``cost`` slices.
+
+        Scanning is chosen until the slices scanned for the index since the last
+        modification add up to the number of all slices, so building the index
+        never costs much more than scanning would.
         """
-        start_element = [Slice(-float("inf"), self.data[0].up_to_key, self.data[0].value)]
-        elems = [Slice(p1.up_to_key, p2.up_to_key, p2.value) for p1, p2 in zip(self.data, self.data[1:])]
-        return start_element + elems
+        scanned = self._indexes.get(("scanned", name), 0) + cost
+        self._indexes["scanned", name] = scanned
+        return scanned >= len(self.data)
+
+    def _integrals(self, start: Any, stop: Any) -> tuple[Any, Any]:
+        """Return the integral and the length of keys mapped to values from start to stop."""
+        if isinstance(self.data, SlicerTree):
+            integrals = self.data.integrals(start, stop)
+            # Values that are not numbers are not summed in the tree
+            if integrals is not None:
+                return integrals
+
+        data = self.data
+        first = data.bisect_right(Slicer(up_to_key=start))
+        last = min(data.bisect_right(Slicer(up_to_key=stop)), len(data) - 1)
+        prefix_sums = self._indexes.get("prefix_sums")
+        if prefix_sums is None and self._should_index("prefix_sums", last - first + 1):
+            boundaries, values, missing = self._columns()
+            try:
+                prefix_sums = PrefixSums(boundaries[:-1], values, missing)
+            except TypeError:
+                # Some values are not numbers, ranges without them can still be scanned
+                prefix_sums = False
+            self._indexes["prefix_sums"] = prefix_sums
+        if prefix_sums:
+            return prefix_sums.integral(start, stop), prefix_sums.measure(start, stop)
+
+        integral = length = 0
+        prev_key = data[first - 1].up_to_key if first > 0 else -float("inf")
+        for slicer in data.islice(first, last + 1):
+            if not slicer.missing and slicer.value is not None:
+                part = min(slicer.up_to_key, stop) - max(prev_key, start)
+                integral += _scaled(slicer.value, part)
+                length += part
+            prev_key = slicer.up_to_key
+        return integral, length
 
     def __setitem__(self, slice_key: slice, value: Any) -> None:
         """Add a new slice to SliceMap. All values in slice key will map to the value.
@@ -81,39 +831,259 @@ class SliceMap:
         assert isinstance(slice_key, slice)
         assert slice_key.step == 1 or slice_key.step is None
 
+        instrumentation = self.instrumentation
+        started = instrumentation.start() if instrumentation is not None else None
+
         start = slice_key.start if slice_key.start is not None else -float("inf")
         stop = slice_key.stop if slice_key.stop is not None else float("inf")
 
-        logging.debug("Inserting value %s between keys %s:%s", value, start, stop)
         if start >= stop:
-            logging.debug("Empty slice")
             return
+        self._check_hashable((value,))
+
+        self._finger = None
+        if self._indexes:
+            self._indexes.clear()
+        if self._data_refs[0] > 1:
+            self._unshare()
+        if self.intern_values:
+            value = self._intern(value)
+        if self.track_measures or self.index_values:
+            tracked = self._untrack(start, stop)
 
-        start_key_idx = self.data.bisect_left(Slicer(up_to_key=start))
-        end_key_idx = self.data.bisect_right(Slicer(up_to_key=stop))
-        if start_key_idx < len(self.data):
-            old_value_to_keep = self.data[start_key_idx].value
-            old_missing = self.data[start_key_idx].missing
+        data = self.data
+        if stop < float("inf") and len(data) > 1 and start >= data[-2].up_to_key:
+            # Fast path for appending after the last finite boundary, the boundary
+            # at start is kept instead of being replaced, but counts as replaced
+            num_el_to_remove = 1
+            if start > data[-2].up_to_key:
+                num_el_to_remove = 0
+                tail = data[-1]
+                data.add(Slicer(up_to_key=start, value=tail.value, missing=tail.missing))
+            data.add(Slicer(up_to_key=stop, value=value, missing=False))
+            idx = len(data) - 2
         else:
-            old_value_to_keep = None
-            old_missing = True
-        num_el_to_remove = end_key_idx - start_key_idx
+            start_key_idx = data.bisect_left(Slicer(up_to_key=start))
+            end_key_idx = data.bisect_right(Slicer(up_to_key=stop))
+            if start_key_idx < len(data):
+                old_value_to_keep = data[start_key_idx].value
+                old_missing = data[start_key_idx].missing
+            else:
+                old_value_to_keep = None
+                old_missing = True
+            num_el_to_remove = end_key_idx - start_key_idx
+            del data[start_key_idx:end_key_idx]
 
-        logging.debug("Will remove %s values", num_el_to_remove)
+            if start > -float("inf"):
+                data.add(Slicer(up_to_key=start, value=old_value_to_keep, missing=old_missing))
+            data.add(Slicer(up_to_key=stop, value=value, missing=False))
+            idx = start_key_idx if start == -float("inf") else start_key_idx + 1
 
-        for _ in range(num_el_to_remove):
-            logging.debug(
-                "Removing value %s up to key %s",
-                self.data[start_key_idx].value,
-                self.data[start_key_idx].up_to_key,
-            )
-            self.data.pop(start_key_idx)
+        if self.coalesce:
+            # Only the new slice has new neighbours, so only it can be merged
+            self._coalesce(idx, idx)
+
+        if self.track_measures or self.index_values:
+            self._retrack(*tracked)
+        if instrumentation is not None:
+            instrumentation.on_insert(num_el_to_remove, started)
+
+    def append(self, start: SupportsFloat | None, stop: SupportsFloat | None, value: Any) -> None:
+        """Add a new slice that starts at or after the last finite boundary.
+
+        Same as ``sm[start:stop] = value``, but checks that nothing is overwritten
+        except the last slice. Such slices skip searching for overlapped slices and
+        are added at the end of the storage, which is the fastest way to build
+        SliceMap from slices ordered by keys.
+
+        Parameters
+        ----------
+        start
+            The first key of the slice. None means an unbounded slice.
+        stop
+            The last key of the slice. None means an unbounded slice.
+        value
+            Any python object can be a value.
+        """
+        start = start if start is not None else -float("inf")
+        last_key = self.data[-2].up_to_key if len(self.data) > 1 else -float("inf")
+        assert start >= last_key, f"Appended slice must start at or after the last boundary {last_key}"
+        self[start:stop] = value
+
+    def add(self, slice_key: slice, delta: Any) -> None:
+        """Add delta to the values of all keys in the slice.
 
-        logging.debug("Inserting value %s up to key %s", old_value_to_keep, start)
-        logging.debug("Inserting value %s up to key %s", value, stop)
-        if start > -float("inf"):
-            self.data.add(Slicer(up_to_key=start, value=old_value_to_keep, missing=old_missing))
-        self.data.add(Slicer(up_to_key=stop, value=value, missing=False))
+        Slices partially covered by the slice key are split at its bounds. Keys that
+        were not set are treated as 0, so ``add`` can build coverage counts or load
+        profiles from scratch. This operation has ``O(k*log(n))`` time complexity,
+        where ``k`` is the number of slices covered by the slice key.
+
+        With ``storage="tree"``, a numeric delta is added lazily in ``O(log(n))`` time
+        instead, if covered slices are numeric or not set and none of ``coalesce``,
+        ``intern_values``, ``track_measures`` and ``index_values`` is enabled. Then
+        ``aggregate``, ``integrate`` and ``mean`` stay ``O(log(n))`` too.
+
+        Parameters
+        ----------
+        slice_key
+            Slice of numerical values, like in ``__setitem__``.
+        delta
+            Value added to the values of covered slices.
+        """
+        assert isinstance(slice_key, slice)
+        assert slice_key.step == 1 or slice_key.step is None
+
+        instrumentation = self.instrumentation
+        started = instrumentation.start() if instrumentation is not None else None
+
+        start = slice_key.start if slice_key.start is not None else -float("inf")
+        stop = slice_key.stop if slice_key.stop is not None else float("inf")
+
+        if start >= stop:
+            return
+
+        # Covered slices, before they're split at the bounds of the slice key
+        data = self.data
+        first = data.bisect_right(Slicer(up_to_key=start))
+        last = min(data.bisect_left(Slicer(up_to_key=stop)), len(data) - 1)
+        lazy = (
+            isinstance(data, SlicerTree)
+            and isinstance(delta, (int, float))
+            and not (self.coalesce or self.intern_values or self.track_measures or self.index_values)
+            and data.accepts_delta(first, last + 1)
+        )
+        # New values are computed before any modification, so SliceMap is left intact if it fails
+        values = None if lazy else [(0 if x.missing else x.value) + delta for x in data.islice(first, last + 1)]
+        if values is not None:
+            self._check_hashable(values)
+
+        self._finger = None
+        if self._indexes:
+            self._indexes.clear()
+        if self._data_refs[0] > 1:
+            self._unshare()
+        if self.track_measures or self.index_values:
+            tracked = self._untrack(start, stop)
+
+        first = self._split_at(start) + 1 if start > -float("inf") else 0
+        last = self._split_at(stop) if stop < float("inf") else len(self.data) - 1
+
+        if values is not None and self.intern_values:
+            values = [self._intern(x) for x in values]
+        if values is None:
+            self.data.add_delta(first, last + 1, delta)
+        elif isinstance(self.data, SlicerArray):
+            self.data.values[first : last + 1] = values
+            self.data.missing[first : last + 1] = bytes(len(values))
+        else:
+            # Slicers are shared with snapshots, so they are replaced instead of modified
+            keys = [x.up_to_key for x in self.data.islice(first, last + 1)]
+            del self.data[first : last + 1]
+            for key, value in zip(keys, values):
+                self.data.add(Slicer(up_to_key=key, value=value))
+
+        if self.coalesce:
+            self._coalesce(first, last)
+
+        if self.track_measures or self.index_values:
+            self._retrack(*tracked)
+        if instrumentation is not None:
+            instrumentation.on_insert(0, started)
+
+    def measure(self, value: Any) -> Measure:
+        """Return the total length of keys and the number of slices mapped to the value.
+
+        Requires ``track_measures=True``. Measures are updated with each modification
+        of SliceMap, so this query takes ``O(1)`` time. Values are compared like
+        dictionary keys, e.g. ``1`` and ``1.0`` are the same value.
+
+        Returns
+        -------
+        Measure
+            Named tuple ``(length, count, unbounded)``. ``length`` is the total length
+            of bounded slices, ``count`` the number of all slices and ``unbounded``
+            the number of slices starting at ``-inf`` or ending at ``inf``, whose
+            length is not included in ``length``.
+        """
+        assert self.track_measures, "SliceMap must be created with `track_measures=True`"
+        return Measure(*self._measures.get(value, (0, 0, 0)))
+
+    def measures(self) -> dict[Any, Measure]:
+        """Return measures of all values set in SliceMap. See ``measure``."""
+        assert self.track_measures, "SliceMap must be created with `track_measures=True`"
+        return {value: Measure(*measure) for value, measure in self._measures.items()}
+
+    def find(self, value: Any) -> Iterator[Slice]:
+        """Iterate over all slices mapped to the value, ordered by keys.
+
+        Requires ``index_values=True``. Slices are read from the reverse index, so
+        iterating takes ``O(k)`` time for ``k`` slices with the value. Values are
+        compared like dictionary keys, e.g. ``1`` and ``1.0`` are the same value.
+        SliceMap must not be modified during the iteration.
+
+        Yields
+        ------
+        Slice
+            Named tuples ``(start, end, value)``.
+        """
+        assert self.index_values, "SliceMap must be created with `index_values=True`"
+        for end, start in self._value_index.get(value, ()):
+            yield Slice(start, end, value)
+
+    def _untrack(self, start: SupportsFloat, stop: SupportsFloat) -> tuple[int, SupportsFloat]:
+        """Remove slices overlapping keys from start to stop from measures and the reverse index.
+
+        Called before these slices are modified.
+
+        Returns the index of the first of these slices and the end of the last one.
+        """
+        data = self.data
+        first = data.bisect_left(Slicer(up_to_key=start)) if start > -float("inf") else 0  # type: ignore
+        last = min(data.bisect_right(Slicer(up_to_key=stop)), len(data) - 1)
+        self._track(first, last, -1)
+        return first, data[last].up_to_key
+
+    def _retrack(self, first: int, end: SupportsFloat) -> None:
+        """Add slices from the index first to the end to measures and the reverse index, after modifying them."""
+        self._track(first, self.data.bisect_left(Slicer(up_to_key=end)), 1)
+
+    def _track(self, first: int, last: int, sign: int) -> None:
+        """Add (or remove, with negative sign) slices from index first to last to measures and the reverse index."""
+        measures = self._measures
+        value_index = self._value_index
+        prev_key = self.data[first - 1].up_to_key if first > 0 else -float("inf")
+        for slicer in self.data.islice(first, last + 1):
+            value = slicer.value
+            if not slicer.missing and self.index_values:
+                if sign > 0:
+                    if value not in value_index:
+                        value_index[value] = SortedList()
+                    value_index[value].add((slicer.up_to_key, prev_key))
+                else:
+                    value_index[value].remove((slicer.up_to_key, prev_key))
+                    if not value_index[value]:
+                        del value_index[value]
+
+            if not slicer.missing and self.track_measures:
+                length, count, unbounded = measures.get(value, (0, 0, 0))
+                if prev_key == -float("inf") or slicer.up_to_key == float("inf"):
+                    unbounded += sign
+                else:
+                    length += sign * (slicer.up_to_key - prev_key)
+                count += sign
+                if count:
+                    measures[value] = (length, count, unbounded)
+                else:
+                    del measures[value]
+            prev_key = slicer.up_to_key
+
+    def _split_at(self, key: SupportsFloat) -> int:
+        """Make sure that a slice ends at the finite key. Returns index of this slice."""
+        idx = self.data.bisect_left(Slicer(up_to_key=key))
+        slicer = self.data[idx]
+        if slicer.up_to_key != key:
+            self.data.add(Slicer(up_to_key=key, value=slicer.value, missing=slicer.missing))
+        return idx
 
     def __getitem__(self, key: SupportsFloat | slice) -> Any:
         """Check the value under the given key.
@@ -138,37 +1108,220 @@ class SliceMap:
             KeyError will be raised when trying to access a key that was not set.
 
         """
-        if key == float("inf"):
-            return self._maybe_get_value(self.data[-1], key)
-        if key == -float("inf"):
-            return self._maybe_get_value(self.data[0], key)
-
-        if self.include == "start":
-            search_op = self.data.bisect_right
-        else:
-            search_op = self.data.bisect_left
+        instrumentation = self.instrumentation
+        started = instrumentation.start() if instrumentation is not None else None
 
         if isinstance(key, slice):
-            if key.start == -float("inf") or key.start is None:
-                idx1 = 0
-            else:
-                idx1 = search_op(Slicer(up_to_key=key.start))
+            idx1, idx2 = self._range_indices(key.start, key.stop)
+            if instrumentation is not None:
+                instrumentation.on_range_lookup(started)
+            return tuple(self._maybe_get_value(x, key) for x in self.data.islice(idx1, idx2 + 1))
 
-            if key.stop == float("inf") or key.stop is None:
-                idx2 = len(self.data) - 1
-            else:
-                idx2 = search_op(Slicer(up_to_key=key.stop))
-
-            return tuple(self._maybe_get_value(self.data[i], key) for i in range(idx1, idx2 + 1))
+        if key == float("inf"):
+            slicer = self.data[-1]
+        elif key == -float("inf"):
+            slicer = self.data[0]
+        elif self.lookup_cache:
+            slicer = self._finger_search(key)[3]
+        elif self.include == "start":
+            slicer = self.data[self.data.bisect_right(Slicer(up_to_key=key))]
         else:
-            idx = search_op(Slicer(up_to_key=key))
-            return self._maybe_get_value(self.data[idx], key)
+            slicer = self.data[self.data.bisect_left(Slicer(up_to_key=key))]
+        if instrumentation is not None:
+            instrumentation.on_lookup(slicer.missing, started)
+        return self._maybe_get_value(slicer, key)
 
     def _maybe_get_value(self, pair: Slicer, key: SupportsFloat | slice):
         if self.raise_missing and pair.missing:
             raise KeyError(f"Key {key} not set in SliceMap!")
         return pair.value
 
+    def get_many(self, keys: Iterable[SupportsFloat], assume_sorted: bool = False) -> Any:
+        """Check the values under many keys at once.
+
+        Follows the same ``include`` and ``raise_missing`` semantics as ``__getitem__``,
+        but avoids per-key overhead. If ``keys`` is a NumPy array, a single
+        ``np.searchsorted`` call over the boundaries is used. Otherwise, if
+        ``assume_sorted`` is True, the keys are matched with a linear merge-scan.
+        In the remaining cases, each key is located with C-level ``bisect``.
+
+        Boundaries of slices are collected in ``O(n)`` time by the first call after
+        SliceMap is modified and reused by the next calls, until it's modified again.
+
+        Parameters
+        ----------
+        keys
+            A list (or any iterable) of numerical keys or a NumPy array.
+        assume_sorted
+            If True, keys must be sorted in non-decreasing order. Enables ``O(n + m)``
+            merge-scan instead of ``O(m*log(n))`` search. Ignored for NumPy arrays.
+
+        Returns
+        -------
+        list | np.ndarray
+            Values for the keys. NumPy array of objects if ``keys`` was a NumPy array,
+            list otherwise.
+
+        Raises
+        ------
+        KeyError
+            If ``raise_missing`` was set to True during SliceMap initialization
+            and any of the keys was not set.
+
+        """
+        if np is not None and isinstance(keys, np.ndarray):
+            boundaries, values, missing = self._arrays()
+        else:
+            boundaries, values, missing = self._columns()
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return _get_many(boundaries, values, missing, keys, self.include, self.raise_missing, assume_sorted)
+
+        started = instrumentation.start()
+        if not isinstance(keys, (list, tuple)) and not (np is not None and isinstance(keys, np.ndarray)):
+            keys = list(keys)
+        key_missing = _get_many(boundaries, missing, missing, keys, self.include, False, assume_sorted)
+        result = _get_many(boundaries, values, missing, keys, self.include, self.raise_missing, assume_sorted)
+        instrumentation.on_lookup(sum(map(bool, key_missing)), started, count=len(key_missing))
+        return result
+
+    def codes(self, keys: Iterable[SupportsFloat], assume_sorted: bool = False) -> Any:
+        """Check integer codes of the values under many keys at once.
+
+        Codes index the table of distinct values returned by ``export(as_codes=True)``.
+        Keys that were not set get code -1. If SliceMap was created with
+        ``intern_values=True``, codes are assigned when values are first set and
+        never change. Otherwise, codes are assigned in the order of slices and are
+        valid only until SliceMap is modified. See ``get_many`` for the parameters.
+
+        Returns
+        -------
+        list[int] | np.ndarray
+            Codes for the keys. NumPy array of integers if ``keys`` was a NumPy array,
+            list otherwise.
+        """
+        boundaries, _, missing = self._columns()
+        slice_codes, _ = self._slice_codes()
+        if np is not None and isinstance(keys, np.ndarray):
+            boundaries, _, missing = self._arrays()
+            if "codes_array" not in self._indexes:
+                self._indexes["codes_array"] = np.array(slice_codes, dtype=np.int64)
+            slice_codes = self._indexes["codes_array"]
+        return _get_many(boundaries, slice_codes, missing, keys, self.include, False, assume_sorted)
+
+    def join_ranges(
+        self,
+        starts: Iterable[SupportsFloat],
+        stops: Iterable[SupportsFloat],
+        assume_sorted: bool = False,
+    ) -> tuple[Any, Any]:
+        """Find slices overlapping many ranges of keys at once.
+
+        For each range from ``starts[i]`` to ``stops[i]``, finds the same slices whose
+        values are returned by ``sm[starts[i]:stops[i]]``. They are returned as
+        offsets and lengths, so slices of range ``i`` have indices from ``offsets[i]``
+        to ``offsets[i] + lengths[i] - 1`` in ``export()``, or in codes returned by
+        ``export(as_codes=True)``. Nothing is materialized for individual ranges.
+
+        If ``starts`` and ``stops`` are NumPy arrays, ``np.searchsorted`` is used.
+        Otherwise, if ``assume_sorted`` is True, range bounds are matched with two
+        linear merge-scans in ``O(n + m)`` time. In the remaining cases, each bound
+        is located with C-level ``bisect``.
+
+        Parameters
+        ----------
+        starts
+            The first keys of ranges. Use ``-inf`` for ranges without the first key.
+        stops
+            The last keys of ranges. Use ``inf`` for ranges without the last key.
+        assume_sorted
+            If True, both ``starts`` and ``stops`` must be sorted in non-decreasing
+            order, which holds e.g. for non-overlapping windows sorted by time.
+            Ignored for NumPy arrays.
+
+        Returns
+        -------
+        tuple[list[int], list[int]] | tuple[np.ndarray, np.ndarray]
+            Offsets and lengths. NumPy arrays of integers if ``starts`` and ``stops``
+            were NumPy arrays, lists otherwise.
+        """
+        boundaries, _, _ = self._columns()
+        last = len(boundaries) - 1
+        if np is not None and isinstance(starts, np.ndarray) and isinstance(stops, np.ndarray):
+            boundaries, _, _ = self._arrays()
+        if not (np is not None and isinstance(starts, np.ndarray)) and not isinstance(starts, (list, tuple)):
+            starts = list(starts)
+        if not (np is not None and isinstance(stops, np.ndarray)) and not isinstance(stops, (list, tuple)):
+            stops = list(stops)
+        assert len(starts) == len(stops), "There must be as many starts as stops"  # type: ignore
+
+        offsets = _slice_indices(boundaries, starts, self.include, assume_sorted, last)
+        ends = _slice_indices(boundaries, stops, self.include, assume_sorted, last)
+        if np is not None and isinstance(offsets, np.ndarray) and isinstance(ends, np.ndarray):
+            return offsets, np.maximum(ends - offsets + 1, 0)
+        return list(offsets), [max(end - offset + 1, 0) for offset, end in zip(offsets, ends)]
+
+    def _slice_codes(self) -> tuple[list[int], list[Any]]:
+        """Return codes of values of all slices and the table of distinct values."""
+        encoded = self._indexes.get("codes")
+        if encoded is None:
+            _, values, missing = self._columns()
+            set_values = [x for x, is_missing in zip(values, missing) if not is_missing]
+            if self.intern_values:
+                value_codes = self._value_codes
+                set_codes: Sequence[int] = [value_codes[type(x), x] for x in set_values]
+                table = self._value_table
+            else:
+                from .fileformat import _encode_values
+
+                set_codes, table = _encode_values(set_values)
+
+            set_codes_iter = iter(set_codes)
+            slice_codes = [-1 if is_missing else next(set_codes_iter) for is_missing in missing]
+            encoded = self._indexes["codes"] = (slice_codes, table)
+        return encoded
+
+    def _columns(self) -> tuple[Sequence, Sequence, Sequence]:
+        """Return boundary keys, values and missing flags as parallel sequences.
+
+        Sequences are cached until SliceMap is modified, so they must not be modified.
+        """
+        if isinstance(self.data, SlicerArray):
+            return self.data.keys, self.data.values, self.data.missing
+        columns = self._indexes.get("columns")
+        if columns is None and isinstance(self.data, SlicerTree):
+            columns = self._indexes["columns"] = self.data.columns()
+        if columns is None:
+            columns = self._indexes["columns"] = (
+                [x.up_to_key for x in self.data],
+                [x.value for x in self.data],
+                [x.missing for x in self.data],
+            )
+        return columns
+
+    def _arrays(self) -> tuple[Any, Any, Any]:
+        """Return boundary keys, values and missing flags as NumPy arrays, cached like ``_columns``."""
+        arrays = self._indexes.get("arrays")
+        if arrays is None:
+            boundaries, values, missing = self._columns()
+            arrays = self._indexes["arrays"] = (np.array(boundaries), _object_array(values), _bool_array(missing))
+        return arrays
+
+    def _float_arrays(self) -> tuple[Any, Any]:
+        """Return start keys of bounded slices and values as float arrays, cached like ``_columns``.
+
+        Values of slices that were not set, or set to None, are NaN. Raises TypeError
+        if other values are not numbers.
+        """
+        floats = self._indexes.get("floats")
+        if floats is None:
+            boundaries, values, missing = self._columns()
+            floats = self._indexes["floats"] = (
+                np.array(boundaries, dtype=float)[:-1],
+                _float_values(values, missing),
+            )
+        return floats
+
     def get_slice_at(self, key: SupportsFloat) -> Slice:
         """Check the slice at the given key."""
 
@@ -178,6 +1331,9 @@ class SliceMap:
             return Slice(self.data[-2].up_to_key, self.data[-1].up_to_key, self.data[-1].value)
         if key == -float("inf"):
             return Slice(-float("inf"), self.data[0].up_to_key, self.data[0].value)
+        if self.lookup_cache:
+            start, end, _, slicer = self._finger_search(key)
+            return Slice(start, end, slicer.value)
 
         if self.include == "start":
             search_op = self.data.bisect_right
@@ -185,7 +1341,61 @@ class SliceMap:
             search_op = self.data.bisect_left
 
         idx = search_op(Slicer(up_to_key=key))
-        return Slice(self.data[idx - 1].up_to_key, self.data[idx].up_to_key, self.data[idx].value)
+        start = self.data[idx - 1].up_to_key if idx > 0 else -float("inf")
+        return Slice(start, self.data[idx].up_to_key, self.data[idx].value)
+
+    def _finger_search(self, key: SupportsFloat) -> tuple:
+        """Find ``(start, end, idx, slicer)`` of the slice at key, starting from the previous one."""
+        finger = self._finger
+        if finger is not None:
+            start, end, idx, slicer = finger
+            if self._contains(start, end, key):
+                return finger
+
+            # Try the neighbour in the direction of the key
+            data = self.data
+            if self._contains(end, float("inf"), key):
+                if idx + 1 < len(data):
+                    next_slicer = data[idx + 1]
+                    if self._contains(end, next_slicer.up_to_key, key):
+                        self._finger = (end, next_slicer.up_to_key, idx + 1, next_slicer)
+                        return self._finger
+            elif idx > 0:
+                prev_start = data[idx - 2].up_to_key if idx > 1 else -float("inf")
+                if self._contains(prev_start, start, key):
+                    self._finger = (prev_start, start, idx - 1, data[idx - 1])
+                    return self._finger
+
+        if self.include == "start":
+            idx = self.data.bisect_right(Slicer(up_to_key=key))
+        else:
+            idx = self.data.bisect_left(Slicer(up_to_key=key))
+        slicer = self.data[idx]
+        start = self.data[idx - 1].up_to_key if idx > 0 else -float("inf")
+        self._finger = (start, slicer.up_to_key, idx, slicer)
+        return self._finger
+
+    def _contains(self, start: SupportsFloat, end: SupportsFloat, key: SupportsFloat) -> bool:
+        if self.include == "start":
+            return start <= key < end  # type: ignore
+        return start < key <= end  # type: ignore
+
+    def stats(self) -> dict[str, Any]:
+        """Return statistics of SliceMap.
+
+        Always includes the number of slices and the approximate memory footprint
+        of the underlying storage in bytes (not counting the values themselves).
+        If SliceMap was created with ``instrumentation``, its counters are included too.
+
+        Returns
+        -------
+        dict
+            Statistics as a dictionary that can be exported to any metrics system.
+        """
+        stats = {"slices": len(self), "memory_bytes": storage_nbytes(self.data)}
+        if self.instrumentation is not None:
+            stats.update(self.instrumentation.report())
+        return stats
 
     def __len__(self) -> int:
         """Return the number of slices in SliceMap.
@@ -201,30 +1411,195 @@ class SliceMap:
         return len(self.data) - 1
 
     def __repr__(self) -> str:
-        start_bracket = "[" if self.include == "start" else "("
-        end_bracket = ")" if self.include == "start" else "]"
-
-        values = []
-
-        p = self.data[0]
-        if p is self.data[-1]:
-            end_bracket = "]"
-
-        values.append(f"[-inf,{p.up_to_key}{end_bracket}: {p.value}")
-
-        for p1, p2 in zip(self.data, self.data[1:]):
-            if p2 is self.data[-1]:
-                end_bracket = "]"
-
-            values.append(f"{start_bracket}{p1.up_to_key},{p2.up_to_key}{end_bracket}: {p2.value}")
-
-        return "{" + ", ".join(values) + "}"
+        return _format_slices(self.iter_slices(), self.include)
 
     def plot(self) -> None:
-        """If values are numerical and matplotlib is installed: plots SliceMap."""
+        """If matplotlib is installed: plots SliceMap. See ``plot_slicemap``."""
         try:
             from slicemap import plot_slicemap
 
             return plot_slicemap(self) if len(self) > 0 else None
         except ImportError:
             logging.error("SliceMap.plot requires matplotlib to be installed! Run `pip install matplotlib`")
+
+
+def _get_many(
+    boundaries: Sequence,
+    values: Sequence,
+    missing: Sequence,
+    keys: Iterable[SupportsFloat],
+    include: str,
+    raise_missing: bool,
+    assume_sorted: bool,
+) -> Any:
+    """Look up many keys in parallel sequences of boundaries, values and missing flags.
+
+    The last boundary, always ``inf``, can be omitted from ``boundaries``.
+    """
+    if np is not None and isinstance(keys, np.ndarray):
+        indices = _slice_indices(boundaries, keys, include, assume_sorted, len(values) - 1)
+        if raise_missing:
+            missing_at = np.flatnonzero(_bool_array(missing)[indices])
+            if len(missing_at):
+                raise KeyError(f"Key {keys[missing_at[0]]} not set in SliceMap!")
+        return (values if isinstance(values, np.ndarray) else _object_array(values))[indices]
+
+    if not isinstance(keys, (list, tuple)):
+        keys = list(keys)
+    indices = _slice_indices(boundaries, keys, include, assume_sorted, len(values) - 1)
+
+    if raise_missing:
+        for key, idx in zip(keys, indices):
+            if missing[idx]:
+                raise KeyError(f"Key {key} not set in SliceMap!")
+    return [values[idx] for idx in indices]
+
+
+def _slice_indices(boundaries: Sequence, keys: Sequence, include: str, assume_sorted: bool, last: int) -> Any:
+    """Find indices of slices at keys, given boundaries of slices and the index of the last slice.
+
+    NumPy array of indices is returned for NumPy array of keys, list otherwise.
+    """
+    if np is not None and isinstance(keys, np.ndarray):
+        side = "right" if include == "start" else "left"
+        return np.minimum(np.searchsorted(np.asarray(boundaries), keys, side=side), last)
+
+    if assume_sorted:
+        indices = []
+        idx = 0
+        if include == "start":
+            for key in keys:
+                while idx < last and boundaries[idx] <= key:
+                    idx += 1
+                indices.append(idx)
+        else:
+            for key in keys:
+                while idx < last and boundaries[idx] < key:
+                    idx += 1
+                indices.append(idx)
+        return indices
+
+    search_op = bisect.bisect_right if include == "start" else bisect.bisect_left
+    return [min(search_op(boundaries, key), last) for key in keys]
+
+
+def _build_columns(chunk: Any, load: Callable[[Any], Iterable] | None) -> tuple[list, list, list]:
+    """Build SliceMap from a chunk of slices in a worker process and return its columns."""
+    sm = SliceMap.from_slices(load(chunk) if load is not None else chunk)
+    keys, values, missing = sm._columns()
+    return list(keys), list(values), list(missing)
+
+
+def _merge_columns(
+    columns1: tuple[Sequence, Sequence, Sequence],
+    columns2: tuple[Sequence, Sequence, Sequence],
+    func: Callable[[Any, Any], Any] | None,
+) -> tuple[list, list, list]:
+    """Merge two SliceMaps given as boundaries, values and missing flags. See ``SliceMap.combine``.
+
+    Without func, the second SliceMap is laid over the first one, see ``SliceMap.overlay``.
+    """
+    keys1, values1, missing1 = columns1
+    keys2, values2, missing2 = columns2
+
+    # Adjacent parts of slices are merged back if their value comes from the same source
+    ends: list[Any] = []
+    values: list[Any] = []
+    missing: list[bool] = []
+    prev_source: Any = None
+    idx1 = idx2 = 0
+    while True:
+        end = min(keys1[idx1], keys2[idx2])
+        if func is None:
+            source: Any = (1, idx1) if missing2[idx2] else (2, idx2)
+        elif missing1[idx1] and missing2[idx2]:
+            source = "missing"
+        else:
+            source = (idx1, idx2)
+
+        if source == prev_source:
+            ends[-1] = end
+        else:
+            ends.append(end)
+            if func is None:
+                values.append(values1[idx1] if missing2[idx2] else values2[idx2])
+                missing.append(bool(missing1[idx1] and missing2[idx2]))
+            elif source == "missing":
+                values.append(None)
+                missing.append(True)
+            else:
+                value1 = None if missing1[idx1] else values1[idx1]
+                value2 = None if missing2[idx2] else values2[idx2]
+                values.append(func(value1, value2))
+                missing.append(False)
+            prev_source = source
+
+        if end == float("inf"):
+            return ends, values, missing
+        if keys1[idx1] == end:
+            idx1 += 1
+        if keys2[idx2] == end:
+            idx2 += 1
+
+
+def _object_array(values: Sequence) -> Any:
+    """Create 1D NumPy array of objects, even if values are sequences themselves."""
+    if hasattr(values, "__array__"):
+        return np.asarray(values, dtype=object)
+    arr = np.empty(len(values), dtype=object)
+    for idx, value in enumerate(values):
+        arr[idx] = value
+    return arr
+
+
+def _bool_array(flags: Sequence) -> Any:
+    """Create 1D NumPy array of booleans, also from bytes, which NumPy would treat as a single value."""
+    if isinstance(flags, (bytes, bytearray, memoryview)):
+        return np.frombuffer(flags, dtype=np.uint8) != 0
+    return np.asarray(flags, dtype=bool)
+
+
+def _float_values(values: Sequence, missing: Sequence) -> Any:
+    """Convert values to a float array, with NaN for slices that were not set or set to None.
+
+    Raises TypeError if any other value is not a number. Strings are not numbers,
+    even if they could be parsed as ones.
+    """
+    values = list(values)
+    for idx in np.flatnonzero(np.asarray(missing, dtype=bool)):
+        values[idx] = np.nan
+    try:
+        array = np.array(values)
+    except ValueError:  # Sequences of different lengths
+        array = None
+    if array is not None and array.ndim == 1:
+        if array.dtype.kind in "biuf":
+            return array.astype(float, copy=False)
+        if array.dtype.kind == "O" and not any(isinstance(x, (str, bytes)) for x in values):
+            try:
+                return np.array([np.nan if x is None else x for x in values], dtype=float)
+            except (TypeError, ValueError):
+                pass
+    raise TypeError("Values must be numbers or None to be converted to floats")
+
+
+def _format_slices(slices: Iterable[Slice], include: str) -> str:
+    """Format slices as ``{[-inf,a): x, [a,b): y, [b,inf]: z}``.
+
+    Slices are consumed one by one, so they can be formatted directly from an iterator.
+    """
+    start_bracket = "[" if include == "start" else "("
+    end_bracket = ")" if include == "start" else "]"
+
+    values = []
+    left = "["
+    slices = iter(slices)
+    prev = next(slices, None)
+    for current in slices:
+        # The slice is formatted once the next one is known, so that the last one is closed with "]"
+        values.append(f"{left}{prev[0]},{prev[1]}{end_bracket}: {prev[2]}")
+        left = start_bracket
+        prev = current
+    if prev is not None:
+        values.append(f"{left}{prev[0]},{prev[1]}]: {prev[2]}")
+    return "{" + ", ".join(values) + "}"
@@ -0,0 +1,713 @@
+from __future__ import annotations
+
+import bisect
+import random
+import sys
+from array import array
+from typing import Any, Iterable, Iterator, SupportsFloat
+
+from .indexes import _scaled
+
+# Values aggregated by SlicerTree, other values are only counted
+_NUMBERS = (int, float)
+_INF = float("inf")
+
+# Priorities of SlicerTree nodes, drawn without affecting the state of the global random generator
+_random = random.Random()
+
+
+class Slicer:
+    """Boundary of a slice: all keys up to ``up_to_key`` map to ``value``."""
+
+    __slots__ = ("up_to_key", "value", "missing")
+
+    def __init__(self, up_to_key: SupportsFloat, value: Any = None, missing: bool = False):
+        self.up_to_key = up_to_key
+        self.value = value
+        self.missing = missing
+
+    def __repr__(self) -> str:
+        return f"Slicer(up_to_key={self.up_to_key!r}, value={self.value!r}, missing={self.missing!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.up_to_key, self.value, self.missing) == (other.up_to_key, other.value, other.missing)  # type: ignore
+
+
+class SlicerArray:
+    """Compact storage of sorted Slicers in parallel arrays.
+
+    Keys are kept in ``array('d')``, values in a list and missing flags in a
+    bytearray. Searching uses C-level ``bisect`` directly on the keys, without
+    any key function. Implements the subset of ``SortedList`` API used by SliceMap,
+    so Slicer objects are only created when elements are accessed.
+
+    Keys are stored as floats, so integer keys are returned as floats.
+    """
+
+    def __init__(self, iterable: Iterable[Slicer] = ()):
+        self.keys = array("d")
+        self.values: list[Any] = []
+        self.missing = bytearray()
+        self.update(iterable)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, idx: int | slice) -> Any:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self.keys)))]
+        return Slicer(self.keys[idx], self.values[idx], bool(self.missing[idx]))
+
+    def __delitem__(self, idx: int | slice) -> None:
+        del self.keys[idx]
+        del self.values[idx]
+        del self.missing[idx]
+
+    def __iter__(self) -> Iterator[Slicer]:
+        for key, value, missing in zip(self.keys, self.values, self.missing):
+            yield Slicer(key, value, bool(missing))
+
+    def islice(self, start: int | None = None, stop: int | None = None, reverse: bool = False) -> Iterator[Slicer]:
+        indices = range(*slice(start, stop).indices(len(self.keys)))
+        for idx in reversed(indices) if reverse else indices:
+            yield Slicer(self.keys[idx], self.values[idx], bool(self.missing[idx]))
+
+    def bisect_left(self, slicer: Slicer) -> int:
+        return bisect.bisect_left(self.keys, slicer.up_to_key)
+
+    def bisect_right(self, slicer: Slicer) -> int:
+        return bisect.bisect_right(self.keys, slicer.up_to_key)
+
+    def add(self, slicer: Slicer) -> None:
+        idx = bisect.bisect_right(self.keys, slicer.up_to_key)
+        self.keys.insert(idx, slicer.up_to_key)
+        self.values.insert(idx, slicer.value)
+        self.missing.insert(idx, slicer.missing)
+
+    def pop(self, idx: int = -1) -> Slicer:
+        slicer = self[idx]
+        del self[idx]
+        return slicer
+
+    def copy(self) -> "SlicerArray":
+        new = SlicerArray()
+        new.keys = array("d", self.keys)
+        new.values = self.values.copy()
+        new.missing = self.missing.copy()
+        return new
+
+    def clear(self) -> None:
+        del self[:]
+
+    def update(self, iterable: Iterable[Slicer]) -> None:
+        slicers = sorted([*self, *iterable], key=lambda x: x.up_to_key)
+        self.keys = array("d", [x.up_to_key for x in slicers])
+        self.values = [x.value for x in slicers]
+        self.missing = bytearray(x.missing for x in slicers)
+
+
+class _TreeNode:
+    """Node of SlicerTree, holding a Slicer and aggregates of its subtree."""
+
+    __slots__ = (
+        "key",
+        "value",
+        "missing",
+        "priority",
+        "length",
+        "left",
+        "right",
+        "size",
+        "low",
+        "high",
+        "total",
+        "opaque",
+        "integral",
+        "measure",
+        "length_sum",
+        "set_count",
+        "nones",
+        "tag",
+    )
+
+    def __init__(self, key: SupportsFloat, value: Any, missing: bool, length: Any = 0):
+        self.key = key
+        self.value = value
+        self.missing = missing
+        self.priority = _random.random()
+        self.length = length
+        self.left: _TreeNode | None = None
+        self.right: _TreeNode | None = None
+        self.tag: Any = None
+
+
+def _update(node: _TreeNode) -> None:
+    """Recompute aggregates of the node's subtree from its children.
+
+    ``low``, ``high`` and ``total`` are the minimum, maximum and sum of numeric values
+    of slices that were set, or None if there are none. ``opaque`` counts slices that
+    were set to other values, except None. ``integral`` is the sum of numeric values
+    multiplied by lengths of their slices and ``measure`` the sum of these lengths.
+    ``length_sum`` is the sum of lengths of all slices, ``set_count`` the number of
+    slices set to numeric values and ``nones`` the number of slices set to None.
+    Lengths of unbounded slices are 0. The node must not have a pending tag.
+    """
+    size = 1
+    opaque = set_count = nones = 0
+    integral = measure = 0
+    length_sum = node.length
+    value = node.value
+    if node.missing:
+        low = high = total = None
+    elif value is None:
+        low = high = total = None
+        nones = 1
+    elif isinstance(value, _NUMBERS):
+        low = high = total = value
+        set_count = 1
+        measure = node.length
+        integral = value * measure if measure else 0
+    else:
+        low = high = total = None
+        opaque = 1
+
+    left = node.left
+    if left is not None:
+        size += left.size
+        opaque += left.opaque
+        set_count += left.set_count
+        nones += left.nones
+        integral = left.integral + integral
+        measure = left.measure + measure
+        length_sum = left.length_sum + length_sum
+        if left.total is not None:
+            if total is None:
+                low, high, total = left.low, left.high, left.total
+            else:
+                low = left.low if left.low < low else low
+                high = left.high if left.high > high else high
+                total = left.total + total
+    right = node.right
+    if right is not None:
+        size += right.size
+        opaque += right.opaque
+        set_count += right.set_count
+        nones += right.nones
+        integral = integral + right.integral
+        measure = measure + right.measure
+        length_sum = length_sum + right.length_sum
+        if right.total is not None:
+            if total is None:
+                low, high, total = right.low, right.high, right.total
+            else:
+                low = right.low if right.low < low else low
+                high = right.high if right.high > high else high
+                total = total + right.total
+
+    node.size = size
+    node.opaque = opaque
+    node.low = low
+    node.high = high
+    node.total = total
+    node.integral = integral
+    node.measure = measure
+    node.length_sum = length_sum
+    node.set_count = set_count
+    node.nones = nones
+
+
+def _compose(tag: Any, delta: Any) -> Any:
+    """Combine a pending delta with a newer one. None means no delta."""
+    if tag is None:
+        return delta
+    if delta is None:
+        return tag
+    return tag + delta
+
+
+def _tagged(node: _TreeNode, delta: Any) -> tuple[Any, bool]:
+    """Value and missing flag of the node's slice after adding delta, if it's not None."""
+    if delta is None:
+        return node.value, node.missing
+    return (0 if node.missing else node.value) + delta, False
+
+
+def _shifted(node: _TreeNode, delta: Any) -> tuple[Any, Any, Any, Any, Any]:
+    """Return ``low``, ``high``, ``total``, ``integral`` and ``measure`` of the subtree after adding delta.
+
+    Slices that were not set take the value of delta. The subtree must not contain
+    slices set to None or values that are not numbers.
+    """
+    if delta is None:
+        return node.low, node.high, node.total, node.integral, node.measure
+    if node.total is None:
+        low = high = delta
+        total = delta * node.size
+    else:
+        low = node.low + delta
+        high = node.high + delta
+        if node.set_count < node.size:
+            low = low if low < delta else delta
+            high = high if high > delta else delta
+        total = node.total + delta * node.size
+    return low, high, total, node.integral + delta * node.length_sum, node.length_sum
+
+
+def _apply(node: _TreeNode, delta: Any) -> None:
+    """Add delta to values of all slices in the subtree, lazily for the descendants of the node."""
+    node.low, node.high, node.total, node.integral, node.measure = _shifted(node, delta)
+    node.set_count = node.size
+    node.value, node.missing = _tagged(node, delta)
+    node.tag = _compose(node.tag, delta)
+
+
+def _push(node: _TreeNode) -> None:
+    """Pass the pending delta of the node to its children."""
+    tag = node.tag
+    if tag is not None:
+        if node.left is not None:
+            _apply(node.left, tag)
+        if node.right is not None:
+            _apply(node.right, tag)
+        node.tag = None
+
+
+def _size(node: _TreeNode | None) -> int:
+    return node.size if node is not None else 0
+
+
+def _length(key: Any, prev_key: Any) -> Any:
+    """Length of the slice from prev_key to key, 0 for unbounded slices."""
+    if prev_key is None or key == _INF:
+        return 0
+    return key - prev_key
+
+
+def _last_key(node: _TreeNode | None) -> Any:
+    if node is None:
+        return None
+    while node.right is not None:
+        node = node.right
+    return node.key
+
+
+def _set_prev_key(node: _TreeNode, prev_key: Any) -> None:
+    """Update the length of the first slice in the tree, which starts at prev_key."""
+    _push(node)
+    if node.left is not None:
+        _set_prev_key(node.left, prev_key)
+    else:
+        node.length = _length(node.key, prev_key)
+    _update(node)
+
+
+def _split(node: _TreeNode | None, idx: int) -> tuple[_TreeNode | None, _TreeNode | None]:
+    """Split into the first idx nodes and the remaining ones."""
+    if node is None:
+        return None, None
+    _push(node)
+    left_size = _size(node.left)
+    if idx <= left_size:
+        left, node.left = _split(node.left, idx)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, idx - left_size - 1)
+    _update(node)
+    return node, right
+
+
+def _split_key(node: _TreeNode | None, key: SupportsFloat) -> tuple[_TreeNode | None, _TreeNode | None]:
+    """Split into nodes with keys up to key (inclusive) and the remaining ones."""
+    if node is None:
+        return None, None
+    _push(node)
+    if key < node.key:  # type: ignore
+        left, node.left = _split_key(node.left, key)
+        _update(node)
+        return left, node
+    node.right, right = _split_key(node.right, key)
+    _update(node)
+    return node, right
+
+
+def _merge(left: _TreeNode | None, right: _TreeNode | None) -> _TreeNode | None:
+    """Merge two trees, all keys in left must not be greater than keys in right."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        _push(left)
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    _push(right)
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _build(slicers: Iterable[Slicer]) -> _TreeNode | None:
+    """Build a tree from sorted Slicers in ``O(n)`` time."""
+    # Nodes on the right spine of the tree, each with a lower priority than the previous one
+    spine: list[_TreeNode] = []
+    prev_key = None
+    for slicer in slicers:
+        node = _TreeNode(slicer.up_to_key, slicer.value, slicer.missing, _length(slicer.up_to_key, prev_key))
+        prev_key = slicer.up_to_key
+        last = None
+        while spine and spine[-1].priority < node.priority:
+            last = spine.pop()
+        node.left = last
+        if spine:
+            spine[-1].right = node
+        spine.append(node)
+    if not spine:
+        return None
+
+    # Aggregates of children must be computed before aggregates of their parents
+    ordered = []
+    stack = [spine[0]]
+    while stack:
+        node = stack.pop()
+        ordered.append(node)
+        for child in (node.left, node.right):
+            if child is not None:
+                stack.append(child)
+    for node in reversed(ordered):
+        _update(node)
+    return spine[0]
+
+
+def _aggregates(node: _TreeNode, start: int, stop: int, parts: list[tuple], delta: Any = None) -> None:
+    """Collect aggregates of subtrees and nodes covering positions from start to stop, in order.
+
+    Parts are ``(low, high, total, opaque, nones)`` tuples. Delta is the sum of pending
+    deltas of the node's ancestors.
+    """
+    if start == 0 and stop == node.size:
+        low, high, total, _, _ = _shifted(node, delta)
+        parts.append((low, high, total, node.opaque, node.nones))
+        return
+    left_size = _size(node.left)
+    child_delta = _compose(delta, node.tag)
+    if start < left_size:
+        _aggregates(node.left, start, min(stop, left_size), parts, child_delta)  # type: ignore
+    if start <= left_size < stop:
+        value, missing = _tagged(node, delta)
+        if missing:
+            parts.append((None, None, None, 0, 0))
+        elif value is None:
+            parts.append((None, None, None, 0, 1))
+        elif isinstance(value, _NUMBERS):
+            parts.append((value, value, value, 0, 0))
+        else:
+            parts.append((None, None, None, 1, 0))
+    if stop > left_size + 1:
+        _aggregates(node.right, max(start - left_size - 1, 0), stop - left_size - 1, parts, child_delta)  # type: ignore
+
+
+class SlicerTree:
+    """Storage of sorted Slicers in a balanced tree (treap), with aggregates of subtrees.
+
+    Each node keeps the size of its subtree, the minimum, maximum and sum of numeric
+    values in it, and the sum of these values multiplied by lengths of their slices.
+    They are updated with each insertion and deletion, in ``O(log(n))`` time, so values
+    of any range of slices can be aggregated or integrated in ``O(log(n))`` time, even
+    if slices are modified between queries. Accessing slices
+    by index is ``O(log(n))`` too. Implements the subset of ``SortedList`` API used by
+    SliceMap, so Slicer objects are only created when elements are accessed.
+
+    A numeric delta can be added to values of a range of slices in ``O(log(n))`` time
+    with ``add_delta``. It's applied to the aggregates of the subtree holding the range
+    right away, but to the slices themselves only lazily: nodes keep a pending delta
+    for their children as ``tag``, which is passed down when a modification descends
+    through the node. Reads add pending deltas of ancestors on the fly instead.
+    """
+
+    def __init__(self, iterable: Iterable[Slicer] = ()):
+        self._root: _TreeNode | None = None
+        self.update(iterable)
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def _node(self, idx: int) -> tuple[_TreeNode, Any]:
+        """Return the node at index idx and the sum of pending deltas of its ancestors."""
+        size = _size(self._root)
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError("SlicerTree index out of range")
+        node = self._root
+        delta = None
+        while True:
+            left_size = _size(node.left)  # type: ignore
+            if idx == left_size:
+                return node, delta  # type: ignore
+            delta = _compose(delta, node.tag)  # type: ignore
+            if idx < left_size:
+                node = node.left  # type: ignore
+            else:
+                idx -= left_size + 1
+                node = node.right  # type: ignore
+
+    def __getitem__(self, idx: int | slice) -> Any:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        node, delta = self._node(idx)
+        return Slicer(node.key, *_tagged(node, delta))
+
+    def __delitem__(self, idx: int | slice) -> None:
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            assert step == 1, "SlicerTree supports only contiguous deletions"
+        else:
+            start = idx + len(self) if idx < 0 else idx
+            stop = start + 1
+            self._node(idx)
+        if start >= stop:
+            return
+        left, rest = _split(self._root, start)
+        _, right = _split(rest, stop - start)
+        if right is not None:
+            _set_prev_key(right, _last_key(left))
+        self._root = _merge(left, right)
+
+    def __iter__(self) -> Iterator[Slicer]:
+        return self.islice()
+
+    def islice(self, start: int | None = None, stop: int | None = None, reverse: bool = False) -> Iterator[Slicer]:
+        start, stop, _ = slice(start, stop).indices(len(self))
+        count = stop - start
+        if count <= 0:
+            return
+
+        # Ancestors of the first node that come after it in the iteration order, with
+        # sums of pending deltas of their own ancestors
+        stack = []
+        node = self._root
+        delta = None
+        idx = stop - 1 if reverse else start
+        while node is not None:
+            left_size = _size(node.left)
+            if idx == left_size:
+                stack.append((node, delta))
+                break
+            if (idx < left_size) != reverse:
+                stack.append((node, delta))
+            delta = _compose(delta, node.tag)
+            if idx < left_size:
+                node = node.left
+            else:
+                idx -= left_size + 1
+                node = node.right
+
+        while count:
+            node, delta = stack.pop()
+            yield Slicer(node.key, *_tagged(node, delta))
+            count -= 1
+            child = node.left if reverse else node.right
+            delta = _compose(delta, node.tag)
+            while child is not None:
+                stack.append((child, delta))
+                delta = _compose(delta, child.tag)
+                child = child.right if reverse else child.left
+
+    def bisect_left(self, slicer: Slicer) -> int:
+        key = slicer.up_to_key
+        idx = 0
+        node = self._root
+        while node is not None:
+            if node.key < key:  # type: ignore
+                idx += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return idx
+
+    def bisect_right(self, slicer: Slicer) -> int:
+        key = slicer.up_to_key
+        idx = 0
+        node = self._root
+        while node is not None:
+            if node.key <= key:  # type: ignore
+                idx += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return idx
+
+    def add(self, slicer: Slicer) -> None:
+        key = slicer.up_to_key
+        left, right = _split_key(self._root, key)
+        node = _TreeNode(key, slicer.value, slicer.missing, _length(key, _last_key(left)))
+        _update(node)
+        if right is not None:
+            _set_prev_key(right, key)
+        self._root = _merge(_merge(left, node), right)
+
+    def pop(self, idx: int = -1) -> Slicer:
+        slicer = self[idx]
+        del self[idx]
+        return slicer
+
+    def copy(self) -> "SlicerTree":
+        new = SlicerTree()
+        new._root = _build(self)
+        return new
+
+    def clear(self) -> None:
+        self._root = None
+
+    def update(self, iterable: Iterable[Slicer]) -> None:
+        self._root = _build(sorted([*self, *iterable], key=lambda x: x.up_to_key))
+
+    def aggregates(self, start: int, stop: int) -> tuple[Any, Any, Any, int]:
+        """Aggregate values of slices from index start to stop (exclusive) in ``O(log(n))`` time.
+
+        Returns the minimum, maximum and sum of numeric values of slices that were set
+        (None if there are none) and the number of slices set to other values, except None.
+        """
+        parts: list[tuple] = []
+        if self._root is not None and start < stop:
+            _aggregates(self._root, start, stop, parts)
+
+        low = high = total = None
+        opaque = 0
+        for part_low, part_high, part_total, part_opaque, _ in parts:
+            opaque += part_opaque
+            if part_total is None:
+                continue
+            if total is None:
+                low, high, total = part_low, part_high, part_total
+            else:
+                low = min(low, part_low)
+                high = max(high, part_high)
+                total = total + part_total
+        return low, high, total, opaque
+
+    def accepts_delta(self, start: int, stop: int) -> bool:
+        """Check in ``O(log(n))`` time if slices from index start to stop (exclusive) are numeric or not set.
+
+        Only then ``add_delta`` can be used for them.
+        """
+        parts: list[tuple] = []
+        if self._root is not None and start < stop:
+            _aggregates(self._root, start, stop, parts)
+        return not any(opaque or nones for _, _, _, opaque, nones in parts)
+
+    def add_delta(self, start: int, stop: int, delta: Any) -> None:
+        """Add delta to values of slices from index start to stop (exclusive) in ``O(log(n))`` time.
+
+        Slices that were not set are treated as 0 and become set. The delta is kept as
+        a tag of the subtree holding these slices and passed down to its children only
+        when they're accessed by a modification. Slices must be accepted by ``accepts_delta``.
+        """
+        if start >= stop:
+            return
+        left, rest = _split(self._root, start)
+        middle, right = _split(rest, stop - start)
+        _apply(middle, delta)  # type: ignore
+        self._root = _merge(_merge(left, middle), right)
+
+    def integrals(self, start: Any, stop: Any) -> tuple[Any, Any] | None:
+        """Integrate numeric values from key start to stop in ``O(log(n))`` time.
+
+        Returns the integral and the length of keys mapped to numeric values, or None
+        if any slice in the range was set to a value that is not a number. Slices that
+        were not set or set to None count as zero.
+        """
+        first = self.bisect_right(Slicer(start))
+        last = min(self.bisect_right(Slicer(stop)), len(self) - 1)
+        if self.aggregates(first, last + 1)[3]:
+            return None
+        start_integral, start_measure = self._cumulative(start)
+        stop_integral, stop_measure = self._cumulative(stop)
+        return stop_integral - start_integral, stop_measure - start_measure
+
+    def _cumulative(self, key: Any) -> tuple[Any, Any]:
+        """Integrate from the first boundary (or from 0, if there are none) to key. See ``PrefixSums``."""
+        integral = measure = 0
+        prev_key = None
+        found = None
+        node = self._root
+        delta = None
+        while node is not None:
+            child_delta = _compose(delta, node.tag)
+            if node.key <= key and node.key != _INF:
+                left = node.left
+                if left is not None:
+                    _, _, _, left_integral, left_measure = _shifted(left, child_delta)
+                    integral += left_integral
+                    measure += left_measure
+                value, missing = _tagged(node, delta)
+                if not missing and value is not None and node.length:
+                    integral += value * node.length
+                    measure += node.length
+                prev_key = node.key
+                node = node.right
+            else:
+                found, found_delta = node, delta
+                node = node.left
+            delta = child_delta
+
+        # The slice at key is the first one ending after it
+        assert found is not None
+        value, missing = _tagged(found, found_delta)
+        is_set = not missing and value is not None
+        value = value if is_set else 0
+        if prev_key is not None:
+            return integral + _scaled(value, key - prev_key), measure + _scaled(int(is_set), key - prev_key)
+        if found.key == _INF:
+            return _scaled(value, key), _scaled(int(is_set), key)
+        return -_scaled(value, found.key - key), -_scaled(int(is_set), found.key - key)
+
+    def columns(self) -> tuple[list, list, list]:
+        """Return keys, values and missing flags of all slices as parallel lists."""
+        keys, values, missing = [], [], []
+        stack = []
+        node = self._root
+        delta = None
+        while stack or node is not None:
+            if node is not None:
+                stack.append((node, delta))
+                delta = _compose(delta, node.tag)
+                node = node.left
+            else:
+                node, delta = stack.pop()
+                keys.append(node.key)
+                if delta is None:
+                    values.append(node.value)
+                    missing.append(node.missing)
+                else:
+                    value, is_missing = _tagged(node, delta)
+                    values.append(value)
+                    missing.append(is_missing)
+                delta = _compose(delta, node.tag)
+                node = node.right
+        return keys, values, missing
+
+    def _nodes(self) -> Iterator[_TreeNode]:
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                yield node
+                stack.append(node.left)
+                stack.append(node.right)
+
+
+def storage_nbytes(data: Any) -> int:
+    """Approximate memory used by SortedList of Slicers, SlicerArray or SlicerTree, without values."""
+    if isinstance(data, SlicerArray):
+        return sys.getsizeof(data.keys) + sys.getsizeof(data.values) + sys.getsizeof(data.missing)
+    if isinstance(data, SlicerTree):
+        return sys.getsizeof(data) + sum(sys.getsizeof(x) + sys.getsizeof(x.key) for x in data._nodes())
+
+    nbytes = sum(sys.getsizeof(x) + sys.getsizeof(x.up_to_key) for x in data)
+    for lists in (data._lists, data._keys):
+        nbytes += sys.getsizeof(lists) + sum(sys.getsizeof(x) for x in lists)
+    return nbytes + sys.getsizeof(data._maxes) + sys.getsizeof(data._index)
@@ -1,3 +1,12 @@
+import json
+import math
+import operator
+import random
+import threading
+
+import pytest
+
+from slicemap import ConcurrentSliceMap, FrozenSliceMap, Instrumentation, PersistentSliceMap
 from slicemap.slicemap import SliceMap
 
 
@@ -215,3 +224,1238 @@ def test_slicing():
     assert sm[2:] == (1, 2, 3, None, 4, None)
     assert sm[:9] == (None, 1, 2, 3, None, 4, None)
     assert sm[:] == (None, 1, 2, 3, None, 4, None)
+
+
+def test_get_many():
+    for include in ("start", "end"):
+        sm = SliceMap(include=include)
+        sm[-10:10] = 0
+        sm[2:4] = 1
+        sm[4:6] = 2
+        sm[7:9] = 3
+        sm[12:15] = 1.5
+
+        keys = [-float("inf"), -11, -10, 2, 3, 4, 5, 6, 7, 9, 10, 12, 14.5, 15, 100, float("inf")]
+        expected = [sm[k] for k in keys]
+        assert sm.get_many(keys) == expected
+        assert sm.get_many(keys, assume_sorted=True) == expected
+        assert sm.get_many(reversed(keys)) == expected[::-1]
+        assert sm.get_many(iter(keys), assume_sorted=True) == expected
+
+
+def test_get_many_raising():
+    sm = SliceMap(raise_missing=True)
+    sm[2:3] = 1
+    sm[3:4] = 2
+
+    assert sm.get_many([2, 3, 3.5]) == [1, 2, 2]
+    for keys in ([2, 4], [1, 2], [float("inf")]):
+        for assume_sorted in (False, True):
+            try:
+                sm.get_many(keys, assume_sorted=assume_sorted)
+                raise AssertionError("KeyError not raised")
+            except KeyError:
+                pass
+
+
+def test_get_many_numpy():
+    np = pytest.importorskip("numpy")
+
+    for include in ("start", "end"):
+        sm = SliceMap(include=include)
+        sm[2:4] = 1
+        sm[4:6] = 2
+        keys = np.array([-np.inf, 1, 2, 3, 4, 5, 6, 7, np.inf])
+        assert list(sm.get_many(keys)) == [sm[k] for k in keys]
+
+
+def test_get_many_after_modifications():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(0)
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        keys = [rng.uniform(-25, 25) for _ in range(20)]
+        for _ in range(50):
+            sm[rng.randint(-20, 20) : rng.randint(-20, 20)] = rng.randint(0, 3)
+            expected = [sm[k] for k in keys]
+            assert sm.get_many(keys) == expected
+            assert list(sm.get_many(np.array(keys))) == expected
+            assert sm.get_many(keys) == expected
+
+
+def test_from_slices_matches_setitem():
+    rng = random.Random(0)
+    for _ in range(50):
+        slices = []
+        for _ in range(rng.randint(0, 30)):
+            a, b = rng.randint(-20, 20), rng.randint(-20, 20)
+            a = None if rng.random() < 0.1 else a
+            b = None if rng.random() < 0.1 else b
+            slices.append((a, b, rng.randint(0, 3)))
+
+        sm = SliceMap()
+        for a, b, v in slices:
+            sm[a:b] = v
+        assert SliceMap.from_slices(slices).export() == sm.export()
+
+        half = len(slices) // 2
+        sm_updated = SliceMap.from_slices(slices[:half])
+        sm_updated.update(slices[half:])
+        assert sm_updated.export() == sm.export()
+
+
+def test_from_slices_keeps_missing():
+    sm = SliceMap.from_slices([(0, 5, "A"), (2, 3, None), (10, None, "B")], raise_missing=True)
+    assert sm.export() == [
+        (-float("inf"), 0, None),
+        (0, 2, "A"),
+        (2, 3, None),
+        (3, 5, "A"),
+        (5, 10, None),
+        (10, float("inf"), "B"),
+    ]
+    assert sm[2] is None
+    with pytest.raises(KeyError):
+        _ = sm[7]
+
+
+def test_storages_match_sortedlist():
+    rng = random.Random(0)
+    for storage in ("array", "tree"):
+        for include in ("start", "end"):
+            sm_list = SliceMap(include=include)
+            sm_other = SliceMap(include=include, storage=storage)
+            for _ in range(300):
+                a, b = rng.randint(-50, 50) / 2, rng.randint(-50, 50) / 2
+                v = rng.randint(0, 3)
+                sm_list[a:b] = v
+                sm_other[a:b] = v
+
+                assert sm_other.export() == sm_list.export()
+                assert len(sm_other) == len(sm_list)
+
+            assert repr(sm_other) == repr(sm_list)
+            keys = [-float("inf")] + [x / 4 for x in range(-110, 110)] + [float("inf")]
+            assert [sm_other[k] for k in keys] == [sm_list[k] for k in keys]
+            assert [sm_other.get_slice_at(k) for k in keys] == [sm_list.get_slice_at(k) for k in keys]
+            assert sm_other.get_many(keys) == sm_list.get_many(keys)
+            assert sm_other[-3:7] == sm_list[-3:7]
+            assert sm_other.copy().export() == sm_list.export()
+
+
+def test_array_storage_from_slices():
+    sm = SliceMap.from_slices([(0, 5, "A"), (2, 3, "B")], raise_missing=True, storage="array")
+    assert sm.export() == [(-float("inf"), 0, None), (0, 2, "A"), (2, 3, "B"), (3, 5, "A"), (5, float("inf"), None)]
+    with pytest.raises(KeyError):
+        _ = sm[5]
+
+
+def test_freeze_matches_slicemap():
+    rng = random.Random(0)
+    for include in ("start", "end"):
+        for raise_missing in (False, True):
+            sm = SliceMap(include=include, raise_missing=raise_missing)
+            for _ in range(100):
+                a, b = rng.randint(-50, 50), rng.randint(-50, 50)
+                sm[a:b] = rng.randint(0, 3)
+            sm[60:70] = None
+            frozen = sm.freeze()
+
+            assert len(frozen) == len(sm)
+            assert frozen.export() == sm.export()
+            assert repr(frozen) == f"FrozenSliceMap({sm!r})"
+            for k in [-float("inf")] + [x / 2 for x in range(-120, 160)] + [float("inf")]:
+                assert frozen.get_slice_at(k) == sm.get_slice_at(k)
+                try:
+                    expected = sm[k]
+                except KeyError:
+                    with pytest.raises(KeyError):
+                        _ = frozen[k]
+                else:
+                    assert frozen[k] == expected
+            if not raise_missing:
+                assert frozen[-10:20] == sm[-10:20]
+                assert frozen[:] == sm[:]
+            assert frozen.thaw().export() == sm.export()
+            assert frozen.thaw().raise_missing == raise_missing
+
+
+def test_frozen_is_immutable_and_hashable():
+    sm = SliceMap()
+    sm[0:5] = "A"
+    frozen = sm.freeze()
+    with pytest.raises(TypeError):
+        frozen[5:10] = "B"
+
+    sm[5:10] = "B"
+    assert sm[7] == "B"
+    assert frozen[7] is None
+    assert frozen == SliceMap.from_slices([(0, 5, "A")]).freeze()
+    assert frozen != sm.freeze()
+    assert len({frozen, SliceMap.from_slices([(0, 5, "A")]).freeze()}) == 1
+
+
+def test_coalesce():
+    sm = SliceMap(coalesce=True)
+    for i in range(10):
+        sm[i : i + 1] = 5
+    assert len(sm) == 2
+    assert sm.export() == [(-float("inf"), 0, None), (0, 10, 5), (10, float("inf"), None)]
+
+    sm[3:4] = None
+    sm[3:4] = 5
+    assert len(sm) == 2
+
+    sm[None:0] = None
+    assert sm.export() == [(-float("inf"), 0, None), (0, 10, 5), (10, float("inf"), None)]
+    assert sm.get_slice_at(5) == (0, 10, 5)
+
+
+def test_coalesce_matches_compact():
+    rng = random.Random(0)
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        sm_coalesced = SliceMap(storage=storage, coalesce=True)
+        slices = []
+        for _ in range(300):
+            a, b = rng.randint(-30, 30), rng.randint(-30, 30)
+            a = None if rng.random() < 0.05 else a
+            b = None if rng.random() < 0.05 else b
+            v = rng.randint(0, 2)
+            slices.append((a, b, v))
+            sm[a:b] = v
+            sm_coalesced[a:b] = v
+
+            compacted = sm.copy()
+            compacted.compact()
+            assert sm_coalesced.export() == compacted.export()
+        assert SliceMap.from_slices(slices, storage=storage, coalesce=True).export() == sm_coalesced.export()
+
+
+def test_coalesce_with_predicate():
+    sm = SliceMap(coalesce=True, value_eq=lambda a, b: abs(a - b) < 0.1)
+    sm[0:1] = 1.0
+    sm[1:2] = 1.05
+    sm[2:3] = 2.0
+    assert sm.export() == [(-float("inf"), 0, None), (0, 2, 1.05), (2, 3, 2.0), (3, float("inf"), None)]
+
+    # The newly set value is kept, whichever neighbour it's merged with
+    sm = SliceMap(coalesce=True, value_eq=lambda a, b: abs(a - b) < 0.1)
+    sm[1:2] = 1.0
+    sm[0:1] = 1.05
+    assert sm[0.5] == sm[1.5] == 1.05
+    sm[0.5:1.5] = 1.0
+    assert sm.export() == [(-float("inf"), 0, None), (0, 2, 1.0), (2, float("inf"), None)]
+
+    sm = SliceMap(coalesce=True)
+    sm[1:2] = 1
+    sm[0:1] = 1.0
+    assert len(sm) == 2 and type(sm[1.5]) is float
+
+    sm = SliceMap.from_slices([(1, 2, 1), (0, 1, 1.0), (3, 4, 1.0), (2, 3, 1)], coalesce=True)
+    assert len(sm) == 2 and type(sm[3.5]) is int
+
+    sm = SliceMap(coalesce=True)
+    sm[1:2] = 2
+    sm.add(slice(0, 1), 2.0)
+    sm.add(slice(2, 3), 2.0)
+    assert len(sm) == 2 and type(sm[1.5]) is float
+
+    sm = SliceMap()
+    sm[0:1] = 1
+    sm[1:2] = 1.0
+    sm.compact()
+    assert len(sm) == 2 and type(sm[1.5]) is int
+
+
+def test_stats():
+    sm = SliceMap()
+    sm[0:1] = 1
+    sm[1:2] = 2
+    stats = sm.stats()
+    assert stats["slices"] == 3
+    assert stats["memory_bytes"] > 0
+    assert "inserts" not in stats
+
+    sm_array = SliceMap(storage="array")
+    sm_array[0:1] = 1
+    sm_array[1:2] = 2
+    assert 0 < sm_array.stats()["memory_bytes"] < stats["memory_bytes"]
+
+
+def test_stats_with_instrumentation():
+    sm = SliceMap(instrumentation=Instrumentation(latency=True))
+    sm[0:1] = 1
+    sm[1:2] = 2
+    sm[3:3] = 3
+    sm[-1:5] = 4
+    _ = sm[0], sm[10], sm[-float("inf")], sm[0:5]
+    sm.get_many([0, 1, 100, 200])
+
+    stats = sm.stats()
+    assert stats["inserts"] == 3
+    assert stats["removed_boundaries"] == 4
+    assert stats["removed_per_insert"] == {0: 1, 1: 1, 3: 1}
+    assert stats["lookups"] == 7
+    assert stats["misses"] == 4
+    assert stats["range_lookups"] == 1
+    assert sum(stats["insert_latency_ns"].values()) == 3
+    assert sum(stats["lookup_latency_ns"].values()) == 5
+
+    # Copies report to the same instrumentation, which may hold objects that can't be copied
+    class LockedInstrumentation(Instrumentation):
+        def __init__(self):
+            super().__init__()
+            self.lock = threading.Lock()
+
+    instrumentation = LockedInstrumentation()
+    sm = SliceMap(instrumentation=instrumentation)
+    sm[0:1] = 1
+    copy = sm.copy()
+    copy[1:2] = 2
+    assert copy.instrumentation is instrumentation
+    assert copy.export() != sm.export()
+    assert instrumentation.inserts == 2
+
+
+def test_benchmarks_cli(tmp_path):
+    from slicemap import benchmarks
+
+    output = str(tmp_path / "results.json")
+    assert benchmarks.main(["--sizes", "10,20", "--output", output]) == 0
+    with open(output) as f:
+        results = json.load(f)["results"]
+    assert {x["benchmark"] for x in results} >= {"insert_random", "lookup_point", "repr"}
+    assert all(x["operations"] > 0 and x["peak_memory_bytes"] > 0 for x in results)
+
+    assert (
+        benchmarks.main(
+            ["--sizes", "10", "--benchmarks", "export", "--no-memory", "--baseline", output, "--threshold", "0"]
+        )
+        == 0
+    )
+    assert benchmarks.main(["--sizes", "10", "--benchmarks", "export", "--baseline", output, "--threshold", "1e9"]) == 1
+
+
+def test_lookup_cache():
+    rng = random.Random(0)
+    for include in ("start", "end"):
+        for storage in ("sortedlist", "array", "tree"):
+            sm = SliceMap(include=include, storage=storage)
+            sm_cached = SliceMap(include=include, storage=storage, lookup_cache=True)
+            key = 0.0
+            for step in range(2000):
+                if step % 50 == 0:
+                    a, b, v = rng.randint(-20, 20), rng.randint(-20, 20), rng.randint(0, 5)
+                    sm[a:b] = v
+                    sm_cached[a:b] = v
+                key = rng.choice([key + rng.choice([-1, -0.5, 0, 0.5, 1]), rng.randint(-25, 25)])
+                assert sm_cached[key] == sm[key]
+                assert sm_cached.get_slice_at(key) == sm.get_slice_at(key)
+
+
+def test_iter_slices():
+    rng = random.Random(0)
+    for include in ("start", "end"):
+        for storage in ("sortedlist", "array", "tree"):
+            sm = SliceMap.from_slices(
+                [(rng.randint(-20, 20), rng.randint(-20, 20), rng.randint(0, 3)) for _ in range(30)],
+                include=include,
+                storage=storage,
+            )
+            exported = sm.export()
+            assert list(sm.iter_slices()) == exported
+            assert list(sm.iter_slices(reverse=True)) == exported[::-1]
+
+            for _ in range(100):
+                a = rng.choice([None, -float("inf"), rng.randint(-25, 25)])
+                b = rng.choice([None, float("inf"), rng.randint(-25, 25)])
+                window = list(sm.iter_slices(a, b))
+                assert tuple(x.value for x in window) == sm[a:b]
+                assert list(sm.iter_slices(a, b, reverse=True)) == window[::-1]
+                if window:
+                    assert window[0] == sm.get_slice_at(a if a is not None else -float("inf"))
+
+
+def test_save_and_open(tmp_path):
+    rng = random.Random(0)
+    values = ["A", 1, 1.0, True, None, (1, 2), [3]]
+    for include in ("start", "end"):
+        for scale in (1, 0.5):
+            sm = SliceMap(include=include)
+            for _ in range(50):
+                a, b = rng.randint(-20, 20) * scale, rng.randint(-20, 20) * scale
+                sm[a:b] = rng.choice(values)
+            sm[30:40] = None
+
+            path = tmp_path / f"sm-{include}-{scale}.bin"
+            sm.save(path)
+            for use_mmap in (True, False):
+                opened = SliceMap.open(path, mmap=use_mmap)
+                assert opened.export() == sm.export()
+                assert [type(x.value) for x in opened.export()] == [type(x.value) for x in sm.export()]
+                assert opened == sm.freeze()
+                for k in [-float("inf")] + [x / 2 for x in range(-50, 90)] + [float("inf")]:
+                    assert opened[k] == sm[k]
+                    assert opened.get_slice_at(k) == sm.get_slice_at(k)
+                assert opened.thaw().export() == sm.export()
+
+
+def test_open_raises_missing(tmp_path):
+    sm = SliceMap(raise_missing=True, storage="array")
+    sm[0:10] = "A"
+    sm[2:3] = None
+    sm.save(tmp_path / "sm.bin")
+
+    opened = SliceMap.open(tmp_path / "sm.bin")
+    assert opened.raise_missing
+    assert opened[2] is None
+    with pytest.raises(KeyError):
+        _ = opened[10]
+    with pytest.raises(TypeError):
+        opened[0:1] = "B"
+
+    (tmp_path / "other.bin").write_bytes(b"x" * 100)
+    with pytest.raises(ValueError):
+        SliceMap.open(tmp_path / "other.bin")
+
+
+def test_frozen_get_many_numpy(tmp_path):
+    np = pytest.importorskip("numpy")
+    slices = [(0, 10, "A"), (3, 4, (1, 2)), (20, 30, 7)]
+    for raise_missing in (False, True):
+        sm = SliceMap.from_slices(slices, raise_missing=raise_missing)
+        sm.save(tmp_path / "sm.bin")
+        concurrent = ConcurrentSliceMap(raise_missing=raise_missing)
+        concurrent.update(slices)
+        concurrent.publish()
+
+        for frozen in (
+            sm.freeze(),
+            SliceMap.open(tmp_path / "sm.bin"),
+            SliceMap.open(tmp_path / "sm.bin", False),
+            concurrent,
+        ):
+            for _ in range(2):  # arrays created by the first call are reused
+                assert frozen.get_many(np.array([0, 3.5, 5, 25, 29.5])).tolist() == ["A", (1, 2), "A", 7, 7]
+            if raise_missing:
+                with pytest.raises(KeyError):
+                    frozen.get_many(np.array([5, 15]))
+            else:
+                assert frozen.get_many(np.array([5, 15])).tolist() == ["A", None]
+
+
+def test_repr_formats_slices_without_exporting(monkeypatch):
+    def export(self, *args, **kwargs):
+        raise AssertionError("repr must not export slices")
+
+    monkeypatch.setattr(SliceMap, "export", export)
+    monkeypatch.setattr(FrozenSliceMap, "export", export)
+    for storage in ("sortedlist", "tree"):
+        sm = SliceMap(storage=storage, include="end")
+        assert repr(sm) == "{[-inf,inf]: None}"
+        sm[0:5] = "a"
+        sm[3:9] = None
+        expected = "{[-inf,0]: None, (0,3]: a, (3,9]: None, (9,inf]: None}"
+        assert repr(sm) == expected
+        assert repr(sm.freeze()) == f"FrozenSliceMap({expected})"
+
+
+def test_snapshot_copy_on_write():
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage, lookup_cache=True)
+        sm[0:10] = "A"
+        value = ["mutable"]
+        sm[20:30] = value
+
+        snapshot = sm.snapshot()
+        snapshot2 = sm.copy(deep=False)
+        assert snapshot.data is sm.data
+        assert snapshot.export() == sm.export()
+        assert snapshot[25] is value
+
+        sm[5:15] = "B"
+        assert sm[7] == "B"
+        assert snapshot[7] == "A" and snapshot2[7] == "A"
+        assert snapshot.data is snapshot2.data
+
+        snapshot.update([(None, 0, "C")])
+        snapshot2.compact()
+        snapshot2[0:1] = "D"
+        assert sm.export() == [
+            (-float("inf"), 0, None),
+            (0, 5, "A"),
+            (5, 15, "B"),
+            (15, 20, None),
+            (20, 30, value),
+            (30, float("inf"), None),
+        ]
+        assert snapshot.export()[:2] == [(-float("inf"), 0, "C"), (0, 10, "A")]
+        assert snapshot2.export()[:3] == [(-float("inf"), 0, None), (0, 1, "D"), (1, 10, "A")]
+
+        assert sm[7] == "B" and sm.aggregate(op=lambda a, b: b) == value
+        assert sm._indexes and sm._finger is not None
+        deep = sm.copy()
+        assert deep._indexes == {} and deep._finger is None
+        assert deep.export() == sm.export()
+        assert deep[25] is not value
+        assert deep.get_many([7, 25]) == ["B", deep[25]]
+        deep[0:100] = 0
+        assert sm[7] == "B"
+
+
+def test_persistent_slicemap_versions():
+    rng = random.Random(0)
+    for include in ("start", "end"):
+        for raise_missing in (False, True):
+            sm = SliceMap(include=include, raise_missing=raise_missing)
+            psm = PersistentSliceMap(include=include, raise_missing=raise_missing)
+            history = [sm.copy()]
+            for _ in range(60):
+                a = rng.choice([None, rng.randint(-20, 20)])
+                b = rng.choice([None, rng.randint(-20, 20)])
+                v = rng.randint(0, 3)
+                sm[a:b] = v
+                version = psm.set(a, b, v)
+                if version == len(history):
+                    history.append(sm.copy())
+                assert psm.version == len(history) - 1
+
+            keys = [-float("inf")] + [x / 2 for x in range(-50, 50)] + [float("inf")]
+            ranges = [(None, None), (-5, 5), (5, -5), (3, 3), (-30, None), (None, 30)]
+            for version, expected in enumerate(history):
+                view = psm.at(version)
+                assert view.export() == expected.export()
+                assert len(view) == len(expected)
+                assert repr(view) == repr(expected)
+                for k in keys:
+                    assert view.get_slice_at(k) == expected.get_slice_at(k)
+                    try:
+                        value = expected[k]
+                    except KeyError:
+                        with pytest.raises(KeyError):
+                            _ = view[k]
+                    else:
+                        assert view[k] == value
+                if not raise_missing:
+                    for a, b in ranges:
+                        assert view[a:b] == expected[a:b]
+            assert psm.export() == sm.export()
+
+
+def test_persistent_slicemap_retention():
+    psm = PersistentSliceMap(max_versions=3)
+    for i in range(10):
+        psm[i : i + 1] = i
+    assert psm.versions() == [8, 9, 10]
+    assert psm.at(8)[8] is None
+    assert psm.at(10)[9] == 9
+    with pytest.raises(KeyError):
+        psm.at(7)
+
+    psm.evict(before=100)
+    assert psm.versions() == [10]
+    assert psm.set(5, 5, "empty") == 10
+
+
+def test_persistent_slicemap_keeps_global_random_state():
+    random.seed(0)
+    expected = random.random()
+    random.seed(0)
+    psm = PersistentSliceMap()
+    psm[0:1] = 1
+    assert random.random() == expected
+
+
+def test_concurrent_slicemap():
+    sm = ConcurrentSliceMap()
+    sm[0:10] = "A"
+    assert sm[5] is None
+    assert sm.publish()[5] == "A"
+    assert sm[5] == "A"
+
+    with sm.batch():
+        sm[0:5] = "B"
+        sm.update([(5, 10, "C")])
+        assert sm.export() == [(-float("inf"), 0, None), (0, 10, "A"), (10, float("inf"), None)]
+    assert sm[0:10] == ("B", "C", None)
+    assert sm.get_slice_at(7) == (5, 10, "C")
+    assert sm.get_many([1, 7]) == ["B", "C"]
+    assert len(sm) == 3
+    assert repr(sm) == "ConcurrentSliceMap({[-inf,0): None, [0,5): B, [5,10): C, [10,inf]: None})"
+
+
+def test_concurrent_slicemap_stress():
+    sm = ConcurrentSliceMap()
+    num_batches = 300
+    errors = []
+
+    def writer():
+        for batch in range(1, num_batches + 1):
+            with sm.batch():
+                for i in range(10):
+                    sm[i * 10 : i * 10 + 10] = batch
+
+    def reader():
+        last_batch = 0
+        try:
+            while last_batch < num_batches:
+                snapshot = sm.snapshot()
+                values = set(snapshot[0:99])
+                assert len(values) == 1, f"Torn snapshot: {values}"
+                batch = values.pop() or 0
+                assert batch >= last_batch
+                assert sm[50] is None or sm[50] >= batch
+                last_batch = batch
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(8)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not errors
+    assert sm[0:99] == (num_batches,) * 10
+
+
+def _lookup_in_shared_slicemap(name, keys):
+    sm = SliceMap.attach(name)
+    return [sm[k] for k in keys], [sm.get_slice_at(k) for k in keys]
+
+
+def test_share_and_attach():
+    from concurrent.futures import ProcessPoolExecutor
+
+    pytest.importorskip("multiprocessing.shared_memory")  # Python 3.8+
+
+    sm = SliceMap(include="end", raise_missing=True)
+    sm[-5:10] = "A"
+    sm[2:4] = (1, 2)
+    sm[20:30] = 1.5
+
+    shm = sm.share()
+    try:
+        keys = [-4.5, 0.5, 2, 3, 4, 10, 25, 30]
+        attached = SliceMap.attach(shm.name)
+        assert attached.export() == sm.export()
+        with pytest.raises(KeyError):
+            _ = attached[15]
+        with pytest.raises(TypeError):
+            attached[0:1] = "B"
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            values, slices = executor.submit(_lookup_in_shared_slicemap, shm.name, keys).result()
+        assert values == [sm[k] for k in keys]
+        assert slices == [sm.get_slice_at(k) for k in keys]
+        del attached
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_share_requires_shared_memory(monkeypatch):
+    import multiprocessing
+    import sys
+
+    # Simulate Python 3.7, which has no multiprocessing.shared_memory
+    monkeypatch.setitem(sys.modules, "multiprocessing.shared_memory", None)
+    monkeypatch.delattr(multiprocessing, "shared_memory", raising=False)
+    with pytest.raises(ImportError, match="Python 3.8"):
+        SliceMap().share()
+    with pytest.raises(ImportError, match="Python 3.8"):
+        SliceMap.attach("name")
+
+
+def test_attach_from_independent_processes():
+    import os
+    import subprocess
+    import sys
+
+    pytest.importorskip("multiprocessing.shared_memory")  # Python 3.8+
+
+    sm = SliceMap()
+    sm[0:10] = "A"
+    shm = sm.share()
+    try:
+        # Processes that are not children of the owner must not unlink the block on exit
+        code = f"from slicemap import SliceMap; print(SliceMap.attach({shm.name!r})[5])"
+        env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+        for _ in range(2):
+            result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr
+            assert result.stdout.strip() == "A"
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_aggregate():
+    for storage in ("sortedlist", "array", "tree"):
+        for include in ("start", "end"):
+            sm = SliceMap(include=include, storage=storage)
+            rng = random.Random(0)
+            for _ in range(200):
+                a, b = sorted(rng.randint(0, 100) for _ in range(2))
+                sm[a:b] = rng.randint(-50, 50)
+
+                start, stop = sorted(rng.uniform(-10, 110) for _ in range(2))
+                values = [x for x in sm[start:stop] if x is not None]
+                assert sm.aggregate(start, stop, "max") == max(values, default=None)
+                assert sm.aggregate(start, stop, "min") == min(values, default=None)
+                assert sm.aggregate(start, stop, "sum") == (sum(values) if values else None)
+
+    sm = SliceMap()
+    assert sm.aggregate(op="sum") is None
+    sm[0:1] = "a"
+    sm[1:2] = "b"
+    sm[3:4] = "c"
+    assert sm.aggregate(op=operator.add) == "abc"
+    assert sm.aggregate(0.5, 3, operator.add) == "abc"
+    assert sm.aggregate(1, 2.5, operator.add) == "b"
+
+    snapshot = sm.snapshot()
+    sm[1:2] = "x"
+    assert sm.aggregate(op=operator.add) == "axc"
+    assert snapshot.aggregate(op=operator.add) == "abc"
+
+
+def test_tree_storage():
+    from slicemap.storage import Slicer, SlicerTree
+
+    rng = random.Random(0)
+    tree = SlicerTree()
+    reference = []
+    for _ in range(500):
+        operation = rng.random()
+        if reference and operation < 0.5:
+            start = rng.randrange(len(reference))
+            stop = min(start + rng.randint(1, 5), len(reference))
+            if operation < 0.15:
+                del tree[start:stop]
+                del reference[start:stop]
+            else:
+                numeric = all(x.missing or isinstance(x.value, int) for x in reference[start:stop])
+                assert tree.accepts_delta(start, stop) == numeric
+                if numeric:
+                    delta = rng.randint(-3, 3)
+                    tree.add_delta(start, stop, delta)
+                    reference[start:stop] = [
+                        Slicer(x.up_to_key, (0 if x.missing else x.value) + delta) for x in reference[start:stop]
+                    ]
+        else:
+            slicer = Slicer(rng.randint(-100, 100), rng.choice([None, "x", rng.randint(-9, 9)]), rng.random() < 0.2)
+            tree.add(slicer)
+            reference.append(slicer)
+            reference.sort(key=lambda x: x.up_to_key)
+
+        assert len(tree) == len(reference)
+        start, stop = sorted(rng.randint(0, len(reference)) for _ in range(2))
+        assert list(tree.islice(start, stop)) == reference[start:stop]
+        assert list(tree.islice(start, stop, reverse=True)) == reference[start:stop][::-1]
+        key = Slicer(rng.randint(-100, 100))
+        assert tree.bisect_left(key) == sum(x.up_to_key < key.up_to_key for x in reference)
+        assert tree.bisect_right(key) == sum(x.up_to_key <= key.up_to_key for x in reference)
+
+        values = [x.value for x in reference[start:stop] if not x.missing and x.value is not None]
+        numbers = [x for x in values if x != "x"]
+        low, high, total, opaque = tree.aggregates(start, stop)
+        assert (low, high) == (min(numbers, default=None), max(numbers, default=None))
+        assert total == (sum(numbers) if numbers else None)
+        assert opaque == len(values) - len(numbers)
+
+    assert tree[-1] == reference[-1] and tree[:3] == reference[:3]
+    assert list(zip(*tree.columns())) == [(x.up_to_key, x.value, x.missing) for x in reference]
+    assert list(tree.copy()) == reference
+    assert tree.pop(0) == reference.pop(0)
+    with pytest.raises(IndexError):
+        _ = tree[len(reference)]
+
+    # Slices that were not set take the value of the delta
+    tree = SlicerTree(Slicer(key, 5, missing=key % 2 == 0) for key in [*range(100), float("inf")])
+    tree.add_delta(0, 101, 1)
+    assert tree.aggregates(0, 101) == (1, 6, 50 * 1 + 51 * 6, 0)
+    assert tree.aggregates(20, 80) == (1, 6, 30 * 1 + 30 * 6, 0)
+    assert tree.integrals(0, 99) == (49 * 1 + 50 * 6, 99)
+
+    # Values that are not numbers are aggregated by scanning
+    sm = SliceMap(storage="tree")
+    sm[0:10] = 5
+    sm[20:21] = "a"
+    sm[21:22] = "b"
+    assert sm.aggregate(0, 10, "max") == 5
+    assert sm.aggregate(20, 22, "max") == "b"
+    with pytest.raises(TypeError):
+        sm.aggregate(0, 22, "sum")
+    sm[20:22] = None
+    assert sm.aggregate(0, 22, "sum") == 5
+
+
+def test_integrate_and_mean():
+    def integrate(sm, start, stop):
+        total = length = 0
+        for a, b, value in sm.export():
+            a, b = max(a, start), min(b, stop)
+            if a < b and value is not None:
+                total += value * (b - a)
+                length += b - a
+        return total, length
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        rng = random.Random(0)
+        for _ in range(200):
+            a, b = sorted(rng.randint(0, 100) for _ in range(2))
+            sm[a:b] = rng.randint(-50, 50)
+
+            start, stop = sorted(rng.uniform(-10, 110) for _ in range(2))
+            total, length = integrate(sm, start, stop)
+            assert sm.integrate(start, stop) == pytest.approx(total)
+            assert sm.mean(start, stop) == (pytest.approx(total / length) if length else None)
+        assert sm.integrate() == pytest.approx(integrate(sm, -float("inf"), float("inf"))[0])
+
+    sm = SliceMap()
+    assert sm.integrate() == 0
+    assert sm.mean() is None
+    sm[0:10] = 2
+    sm[5:6] = 0
+    assert sm.integrate(5, 5) == 0
+    assert sm.mean(-10, 20) == pytest.approx(1.8)
+    sm[:0] = 1
+    assert sm.integrate() == float("inf")
+    assert sm.mean() == 1
+    sm[20:] = 3
+    assert math.isnan(sm.mean())
+    assert sm.mean(-1, None) == 3
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        sm[0:10] = 2
+        sm[2:4] = None
+        sm[20:30] = "a"
+        assert sm.integrate(0, 10) == 16
+        assert sm.mean(0, 10) == 2
+        assert sm.mean(-5, 15) == 2
+        with pytest.raises(TypeError):
+            sm.integrate(5, 25)
+
+
+def test_plot_slicemap_exact_steps():
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    from slicemap import plot_slicemap
+
+    sm = SliceMap()
+    sm[0:100] = 1
+    sm[50:50.001] = 5  # much narrower than a pixel
+    sm[60:70] = None
+    plot_slicemap(sm, show=False)
+    line = plt.gca().lines[0]
+    assert 5 in line.get_ydata()
+    assert list(line.get_xdata()).count(50.001) == 1
+    plt.close("all")
+
+    sm = SliceMap.from_slices((i, i + 1, i % 7) for i in range(10000))
+    sm[5000.5:5000.6] = 100
+    plot_slicemap(sm, show=False)
+    ydata = plt.gca().lines[0].get_ydata()
+    assert len(ydata) < len(sm)
+    assert np.nanmax(ydata) == 100
+    assert np.nanmin(ydata) == 0
+    plt.close("all")
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        sm[0:10] = 1
+        plot_slicemap(sm, show=False)
+        plt.close("all")
+        sm[2:3] = 7  # arrays cached by the first plot must not be reused
+        plot_slicemap(sm, show=False)
+        assert np.nanmax(plt.gca().lines[0].get_ydata()) == 7
+        plt.close("all")
+
+
+def test_plot_slicemap_types_and_categories(tmp_path):
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    from slicemap import plot_slicemap
+
+    sm = SliceMap()
+    sm[0:10] = 1
+    sm[4:6] = 3
+    sm.save(tmp_path / "sm.bin")
+    concurrent = ConcurrentSliceMap()
+    concurrent[0:10] = 1
+    concurrent[4:6] = 3
+    concurrent.publish()
+    persistent = PersistentSliceMap()
+    persistent[0:10] = 1
+    persistent[4:6] = 3
+    for plotted in (sm.freeze(), SliceMap.open(tmp_path / "sm.bin"), concurrent, persistent.at(2)):
+        plot_slicemap(plotted, show=False)
+        assert np.nanmax(plt.gca().lines[0].get_ydata()) == 3
+        plt.close("all")
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage)
+        sm[0:10] = "b"
+        sm[4:6] = "1.5"  # a string, even if it looks like a number
+        sm[8:9] = None
+        sm.save(tmp_path / "str.bin")
+        for plotted in (sm, sm.freeze(), SliceMap.open(tmp_path / "str.bin")):
+            plot_slicemap(plotted, show=False)
+            assert [x.get_text() for x in plt.gca().get_yticklabels()] == ["b", "1.5"]
+            assert np.nanmax(plt.gca().lines[0].get_ydata()) == 1
+            plt.close("all")
+
+    sm = SliceMap()
+    sm[0:10] = [1]
+    with pytest.raises(TypeError, match="numbers, None or hashable"):
+        plot_slicemap(sm, show=False)
+    plt.close("all")
+
+
+def test_codes_and_interning():
+    for intern_values in (False, True):
+        sm = SliceMap(include="end", raise_missing=True, intern_values=intern_values)
+        sm[0:10] = "a"
+        sm[3:4] = ("b", 1)
+        sm[7:8] = "a"
+        sm[8:9] = 1
+        sm[9:10] = 1.0
+
+        keys = [-1, 0, 0.5, 3.5, 7.5, 8.5, 9.5, 20]
+        boundaries, codes, table = sm.export(as_codes=True)
+        assert len(codes) == len(boundaries) + 1 == len(sm) + 1
+        assert sm.codes(keys) == sm.codes(keys[::-1])[::-1] == sm.codes(keys, assume_sorted=True)
+        assert [table[x] if x >= 0 else None for x in sm.codes(keys)] == [None, None, "a", ("b", 1), "a", 1, 1.0, None]
+        assert type(table[sm.codes([9.5])[0]]) is float
+
+        np = pytest.importorskip("numpy")
+        result = sm.codes(np.array(keys))
+        assert result.dtype.kind == "i"
+        assert result.tolist() == sm.codes(keys)
+
+    sm = SliceMap(intern_values=True)
+    sm[0:1] = "".join(["a", "b"])
+    sm[1:2] = "".join(["ab"])
+    sm.update([(2, 3, "".join(["a", "b"]))])
+    assert sm[0.5] is sm[1.5] is sm[2.5]
+    code = sm.codes([0.5])[0]
+    sm[0:1] = "x"
+    sm[5:6] = "y"
+    assert sm.codes([1.5, 0.5]) == [code, sm.export(as_codes=True)[2].index("x")]
+
+    # Values interned by a snapshot don't leak into the original, and vice versa
+    for modify in (
+        lambda x, value: x.__setitem__(slice(0, 1), value),
+        lambda x, value: x.update([(0, 1, value)]),
+        lambda x, value: x.add(slice(0, 1), value),
+    ):
+        for storage in ("sortedlist", "array", "tree"):
+            sm = SliceMap(storage=storage, intern_values=True)
+            sm[0:10] = 1
+            snap = sm.snapshot()
+            modify(snap, 5)
+            assert sm.export(as_codes=True)[2] == [1]
+            modify(sm, 7)
+            assert 7 not in snap.export(as_codes=True)[2]
+            assert snap[0.5] in (5, 6) and sm[0.5] in (7, 8)
+
+
+def test_add():
+    for storage in ("sortedlist", "array", "tree"):
+        for coalesce in (False, True):
+            sm = SliceMap(storage=storage, coalesce=coalesce)
+            expected = [None] * 40
+            rng = random.Random(0)
+            for _ in range(300):
+                a, b = sorted(rng.randint(0, 40) for _ in range(2))
+                value = rng.randint(-3, 3)
+                if rng.random() < 0.3:
+                    snapshot, snapshot_values = sm.snapshot(), [sm[x + 0.5] for x in range(40)]
+                    sm[a:b] = value
+                    expected[a:b] = [value] * (b - a)
+                    assert [snapshot[x + 0.5] for x in range(40)] == snapshot_values
+                else:
+                    sm.add(slice(a, b), value)
+                    expected[a:b] = [(x or 0) + value for x in expected[a:b]]
+                assert [sm[x + 0.5] for x in range(40)] == expected
+            if coalesce:
+                slices = sm.export()
+                assert all(x.value != y.value for x, y in zip(slices, slices[1:]))
+
+    sm = SliceMap()
+    sm.add(slice(None, 5), 1)
+    sm.add(slice(0, None), 2)
+    assert sm.export() == [(-float("inf"), 0, 1), (0, 5, 3), (5, float("inf"), 2)]
+    sm.add(slice(3, 3), 10)
+    assert len(sm) == 2
+
+    # With storage="tree", deltas are added lazily, but queries see them right away
+    rng = random.Random(1)
+    eager, lazy = SliceMap(), SliceMap(storage="tree")
+    for _ in range(300):
+        a, b = sorted(rng.randint(0, 60) for _ in range(2))
+        if rng.random() < 0.2:
+            value = rng.choice([None, rng.randint(-5, 5)])
+            eager[a:b] = lazy[a:b] = value
+        else:
+            delta = rng.randint(-3, 3)
+            try:
+                eager.add(slice(a, b), delta)
+            except TypeError:
+                snapshot = lazy.snapshot()
+                with pytest.raises(TypeError):
+                    lazy.add(slice(a, b), delta)
+                assert lazy.export() == snapshot.export()
+            else:
+                lazy.add(slice(a, b), delta)
+        assert lazy.export() == eager.export()
+        a, b = sorted(rng.uniform(-5, 65) for _ in range(2))
+        for op in ("min", "max", "sum"):
+            assert lazy.aggregate(a, b, op) == eager.aggregate(a, b, op)
+        assert lazy.integrate(a, b) == pytest.approx(eager.integrate(a, b))
+    for start, end, value in eager.export():
+        if value is None:
+            eager[start:end] = lazy[start:end] = 0
+    snapshot = lazy.snapshot()
+    lazy.add(slice(None, None), 100)
+    assert snapshot.export() == eager.export()
+    assert lazy.aggregate(op="min") == 100 + min(x.value for x in eager.export() if x.value is not None)
+
+
+def test_append():
+    for storage in ("sortedlist", "array", "tree"):
+        for coalesce in (False, True):
+            sm = SliceMap(storage=storage, coalesce=coalesce)
+            slices = []
+            start = 0
+            rng = random.Random(0)
+            for _ in range(2000):
+                start += rng.choice([0, 0, 1, 2.5])
+                stop = start + rng.choice([0, 1, 2])
+                value = rng.randint(0, 2)
+                sm.append(start, stop, value)
+                slices.append((start, stop, value))
+                start = max(start, stop)
+            sm.append(start, None, "tail")
+            slices.append((start, None, "tail"))
+            assert sm.export() == SliceMap.from_slices(slices, storage=storage, coalesce=coalesce).export()
+
+    sm = SliceMap()
+    sm[0:10] = 1
+    snapshot = sm.snapshot()
+    sm.append(10, 20, 2)
+    assert snapshot.export() == [(-float("inf"), 0, None), (0, 10, 1), (10, float("inf"), None)]
+    with pytest.raises(AssertionError):
+        sm.append(15, 30, 3)
+
+
+def test_overlay_zip_combine():
+    rng = random.Random(0)
+    for storage in ("sortedlist", "array", "tree"):
+        for include in ("start", "end"):
+            for _ in range(20):
+                base = SliceMap(include=include, storage=storage)
+                other = SliceMap(include=include, storage=storage)
+                for sm in (base, other):
+                    for _ in range(rng.randint(0, 10)):
+                        a, b = sorted(rng.randint(0, 30) for _ in range(2))
+                        sm[a:b] = rng.randint(0, 3)
+
+                expected = base.copy()
+                for start, end, value in other.export():
+                    if value is not None:
+                        expected[start:end] = value
+                assert base.overlay(other).export() == expected.export()
+
+                zipped = base.zip(other)
+                combined = base.combine(other, lambda x, y: (x or 0) + (y or 0))
+                for key in [x / 2 for x in range(-2, 64)]:
+                    values = (base[key], other[key])
+                    assert zipped[key] == (None if values == (None, None) else values)
+                    assert combined[key] == (None if values == (None, None) else (values[0] or 0) + (values[1] or 0))
+
+    sm = SliceMap(coalesce=True)
+    sm[0:10] = 1
+    other = SliceMap()
+    other[5:15] = 1
+    other[20:30] = 2
+    assert sm.overlay(other).export() == [
+        (-float("inf"), 0, None),
+        (0, 15, 1),
+        (15, 20, None),
+        (20, 30, 2),
+        (30, float("inf"), None),
+    ]
+    assert sm.combine(other, lambda x, y: x or y).export() == sm.overlay(other).export()
+
+
+def _load_chunk(seed):
+    rng = random.Random(seed)
+    return [(rng.randint(0, 50), rng.randint(50, 100), seed) for _ in range(10)]
+
+
+def test_build_parallel():
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(5):
+        chunk = []
+        for _ in range(rng.randint(0, 50)):
+            a, b = sorted(rng.randint(0, 100) for _ in range(2))
+            chunk.append((a, b, rng.randint(0, 3)))
+        chunks.append(chunk)
+    chunks.append([(None, 10, "head"), (90, None, "tail")])
+
+    sm = SliceMap.build_parallel(chunks, workers=2, include="end")
+    assert sm.include == "end"
+    assert sm.export() == SliceMap.from_slices([x for chunk in chunks for x in chunk]).export()
+
+    sm = SliceMap.build_parallel(range(3), workers=2, load=_load_chunk, coalesce=True)
+    expected = SliceMap.from_slices([x for seed in range(3) for x in _load_chunk(seed)], coalesce=True)
+    assert sm.export() == expected.export()
+    assert SliceMap.build_parallel([], workers=2).export() == SliceMap().export()
+
+
+def test_join_ranges():
+    rng = random.Random(0)
+    for storage in ("sortedlist", "array", "tree"):
+        for include in ("start", "end"):
+            sm = SliceMap(include=include, storage=storage)
+            for _ in range(30):
+                a, b = sorted(rng.randint(0, 50) for _ in range(2))
+                sm[a:b] = rng.randint(0, 3)
+
+            starts = sorted(rng.choice([-float("inf"), rng.randint(-5, 55), rng.uniform(-5, 55)]) for _ in range(100))
+            stops = sorted(rng.choice([float("inf"), rng.randint(-5, 55), rng.uniform(-5, 55)]) for _ in range(100))
+            slices = sm.export()
+            expected = [sm[a:b] for a, b in zip(starts, stops)]
+
+            for assume_sorted in (False, True):
+                offsets, lengths = sm.join_ranges(starts, stops, assume_sorted=assume_sorted)
+                assert [tuple(x.value for x in slices[o : o + n]) for o, n in zip(offsets, lengths)] == expected
+
+            np = pytest.importorskip("numpy")
+            offsets, lengths = sm.join_ranges(np.array(starts), np.array(stops))
+            assert offsets.dtype.kind == lengths.dtype.kind == "i"
+            assert [tuple(x.value for x in slices[o : o + n]) for o, n in zip(offsets, lengths)] == expected
+
+
+def test_measures():
+    def expected_measures(sm):
+        measures = {}
+        for start, end, value in sm.export():
+            if value is None:
+                continue
+            length, count, unbounded = measures.get(value, (0, 0, 0))
+            if start == -float("inf") or end == float("inf"):
+                measures[value] = (length, count + 1, unbounded + 1)
+            else:
+                measures[value] = (length + end - start, count + 1, unbounded)
+        return measures
+
+    rng = random.Random(0)
+    for storage in ("sortedlist", "array", "tree"):
+        for coalesce in (False, True):
+            sm = SliceMap(storage=storage, coalesce=coalesce, track_measures=True)
+            for step in range(300):
+                a, b = sorted(rng.choice([None, rng.randint(0, 40)]) or 0 for _ in range(2))
+                a = None if rng.random() < 0.05 else a
+                b = None if rng.random() < 0.05 else b
+                operation = rng.random()
+                if operation < 0.6:
+                    sm[a:b] = rng.randint(0, 3)
+                elif operation < 0.8:
+                    sm.add(slice(a, b), rng.randint(-1, 1))
+                elif operation < 0.9:
+                    sm.append(sm.export()[-1].start, rng.choice([None, 100 + step]), rng.randint(0, 3))
+                else:
+                    sm.update([(a, b, rng.randint(0, 3))])
+                assert sm.measures() == expected_measures(sm)
+
+    sm = SliceMap(track_measures=True)
+    sm[0:10] = "A"
+    sm[5:] = "B"
+    snapshot = sm.snapshot()
+    sm[:] = "A"
+    assert snapshot.measure("A") == (5, 1, 0)
+    assert snapshot.measure("B") == (0, 1, 1)
+    assert sm.measure("A") == (0, 1, 1)
+    assert sm.measure("C") == (0, 0, 0)
+    assert sm.overlay(snapshot).measures() == {"A": (5, 2, 1), "B": (0, 1, 1)}
+
+    # Unhashable values are rejected before SliceMap is modified
+    class Unhashable:
+        def __radd__(self, other):
+            return [other]
+
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage, track_measures=True)
+        sm[0:10] = 1
+        sm[20:30] = 2
+        slices = sm.export()
+        for modify in (
+            lambda x: x.__setitem__(slice(5, 25), [3]),
+            lambda x: x.add(slice(5, 25), Unhashable()),
+            lambda x: x.update([(5, 25, 3), (40, 50, [3])]),
+        ):
+            with pytest.raises(TypeError):
+                modify(sm)
+            assert sm.export() == slices
+            assert sm.measures() == {1: (10, 1, 0), 2: (10, 1, 0)}
+
+
+def test_find():
+    rng = random.Random(0)
+    for storage in ("sortedlist", "array", "tree"):
+        for coalesce in (False, True):
+            sm = SliceMap(storage=storage, coalesce=coalesce, index_values=True, track_measures=True)
+            for _ in range(300):
+                a, b = sorted(rng.randint(0, 40) for _ in range(2))
+                a = None if rng.random() < 0.05 else a
+                b = None if rng.random() < 0.05 else b
+                operation = rng.random()
+                if operation < 0.2:
+                    snapshot = sm.snapshot()
+                    expected_snapshot = {value: list(snapshot.find(value)) for value in range(-3, 5)}
+                if operation < 0.6:
+                    sm[a:b] = rng.randint(0, 3)
+                elif operation < 0.8:
+                    sm.add(slice(a, b), rng.randint(-1, 1))
+                else:
+                    sm.update([(a, b, rng.randint(0, 3))])
+                for value in range(-3, 5):
+                    assert list(sm.find(value)) == [x for x in sm.export() if x.value == value]
+            for value in range(-3, 5):
+                assert list(snapshot.find(value)) == expected_snapshot[value]
+
+    sm = SliceMap(index_values=True)
+    sm[0:10] = "A"
+    sm[3:5] = "B"
+    assert list(sm.find("A")) == [(0, 3, "A"), (5, 10, "A")]
+    assert list(sm.find("C")) == []
+
+    # Unhashable values are rejected before SliceMap is modified
+    for storage in ("sortedlist", "array", "tree"):
+        sm = SliceMap(storage=storage, index_values=True)
+        sm[0:10] = "A"
+        sm[3:5] = "B"
+        for modify in (
+            lambda x: x.__setitem__(slice(2, 4), ["C"]),
+            lambda x: x.update([(2, 4, "C"), (6, 7, ["C"])]),
+        ):
+            with pytest.raises(TypeError):
+                modify(sm)
+            assert list(sm.find("A")) == [(0, 3, "A"), (5, 10, "A")]
+            assert list(sm.find("B")) == [(3, 5, "B")]
+        sm[2:4] = "C"
+        assert list(sm.find("A")) == [(0, 2, "A"), (5, 10, "A")]
+        assert list(sm.find("B")) == [(4, 5, "B")]